@@ -0,0 +1,212 @@
+#benchmarks for the game's hot paths, run headless so no window is needed.
+#
+#   python bench.py [--out results.json] [--repeat 20] [--scales 1,2,4] [--seed 1]
+#
+#every timing is reported in milliseconds with its mean and percentiles, as
+#JSON, so that the results of two builds can be compared. memory use per
+#entity and per level is reported too, next to what it would be without
+#__slots__.
+
+import argparse
+import json
+import os
+import sys
+import time
+
+os.environ['DOTD_HEADLESS'] = '1'
+import numpy
+import dotd
+import fov
+import headless
+
+MONSTER_COUNTS = [10, 50, 100, 200, 400]
+
+
+def summarize(samples):
+    #turn a list of timings (in seconds) into milliseconds statistics
+    ms = numpy.array(samples) * 1000.0
+    return {'n': len(samples), 'mean': float(ms.mean()), 'min': float(ms.min()), 'max': float(ms.max()),
+        'p50': float(numpy.percentile(ms, 50)), 'p90': float(numpy.percentile(ms, 90)),
+        'p99': float(numpy.percentile(ms, 99))}
+
+
+def timed(function, *args):
+    start = time.time()
+    function(*args)
+    return time.time() - start
+
+
+def set_map_scale(scale):
+    #scale the map (and the number of rooms, to keep the same density) by a factor per side
+    dotd.MAP_WIDTH = 140 * scale
+    dotd.MAP_HEIGHT = 90 * scale
+    dotd.MAX_ROOMS = 50 * scale * scale
+
+
+def new_level():
+    #what generate_new_level does to build a level: the map with its rooms, monsters and items
+    dotd.new_level_objects()
+    dotd.make_map()
+
+
+def setup_fov():
+    #what generate_new_level does to get the FOV ready, up to the first frame's FOV
+    dotd.init_fov()
+    dotd.update_fov()
+
+
+def render_frame():
+    #a full frame as drawn in a window. the console calls go to the headless
+    #stand-ins, so this measures the work on the python side
+    dotd.HEADLESS = False
+    try:
+        dotd.render_all()
+    finally:
+        dotd.HEADLESS = True
+
+
+def spawn_monsters(count):
+    #fill the level with "count" monsters on random free floor tiles
+    for obj in list(dotd.objects):
+        if obj.ai:
+            dotd.objects.remove(obj)
+    floor = numpy.argwhere(~dotd.map.blocked)
+    numpy.random.shuffle(floor)
+    spots = []
+    for (x, y) in floor:
+        if len(spots) == count:
+            break
+        (x, y) = (int(x), int(y))
+        if not dotd.is_blocked(x, y):
+            spots.append((x, y))
+    dotd.spawn_monsters(spots)
+
+
+def monster_turn():
+    dotd.scheduler.advance()
+
+
+class Plain(object):
+    #an empty dict-backed object, to size what an entity would take without __slots__
+    pass
+
+
+def instance_bytes(obj):
+    #(with __slots__, as dict-backed) bytes of one instance, not counting what its fields point to
+    slotted = sys.getsizeof(obj) + (sys.getsizeof(obj.__dict__) if hasattr(obj, '__dict__') else 0)
+    fields = {}
+    for cls in type(obj).__mro__:
+        for name in getattr(cls, '__slots__', ()):
+            if hasattr(obj, name):
+                fields[name] = getattr(obj, name)
+    return (slotted, sys.getsizeof(Plain()) + sys.getsizeof(fields))
+
+
+def owned_bytes(part):
+    #bytes of the containers a component owns (the kinds and templates are
+    #shared between entities, so they aren't counted)
+    containers = []
+    if isinstance(part, dotd.Fighter) and part.values is not None:
+        containers.append(part.values)  #stats outside a store
+    if isinstance(part, dotd.ModifierStack):
+        containers += [part.sources, part.totals] + list(part.sources.values())
+    return sum(sys.getsizeof(container) for container in containers)
+
+
+def entity_bytes(obj):
+    #bytes of an object and its fighter, modifier stack, AI and item
+    #components, with what they own
+    total = numpy.zeros(2, dtype=numpy.int64)
+    parts = [obj, obj.fighter, obj.fighter and obj.fighter.modifiers, obj.ai, obj.item]
+    if isinstance(obj.ai, dotd.ConfusedMonster):
+        parts.append(obj.ai.old_ai)
+    for part in parts:
+        if part is not None:
+            total += instance_bytes(part)
+            total += owned_bytes(part)
+    return total
+
+
+def memory():
+    #bytes per entity and per level (entities plus the map arrays), compared
+    #with what dict-backed classes would take
+    sizes = numpy.array([entity_bytes(obj) for obj in dotd.objects])
+    terrain = sum(array.nbytes for array in [dotd.map.blocked, dotd.map.block_sight, dotd.map.explored, dotd.map.room_id])
+    stats = sum(column.nbytes for column in dotd.fighter_stats.columns.values())
+    results = {'objects': len(dotd.objects), 'map_and_stats_bytes': int(terrain + stats)}
+    for (i, kind) in enumerate(['slots', 'dict']):
+        results[kind] = {'bytes_per_entity': float(sizes[:, i].mean()),
+            'bytes_per_level': int(sizes[:, i].sum() + terrain + stats)}
+    return results
+
+
+def bench_scale(scale, repeat):
+    set_map_scale(scale)
+    dotd.init_console()
+    dotd.new_game(0)
+    results = {'map_width': dotd.MAP_WIDTH, 'map_height': dotd.MAP_HEIGHT}
+
+    results['level_generation'] = summarize([timed(new_level) for i in range(repeat)])
+    #the ray template for the FOV radius is built once, on the first FOV ever
+    #computed, and kept for every level after: time it on its own, so it
+    #doesn't end up in the first fov_setup sample
+    fov._templates.clear()
+    results['fov_template_build'] = summarize([timed(setup_fov)])
+    results['fov_setup'] = summarize([timed(setup_fov) for i in range(repeat)])
+
+    #render with the player walking around, so the view scrolls and the FOV changes
+    samples = []
+    dirty = []
+    for i in range(repeat * 5):
+        dotd.player_move_or_attack(*[(1, 0), (0, 1), (-1, 0), (0, -1)][i % 4])
+        samples.append(timed(render_frame))
+        dirty.append(dotd.frame.dirty)
+    results['render_frame'] = summarize(samples)
+    #how many of the view's cells each frame had to send to the console
+    results['render_frame']['dirty_cells'] = {'mean': float(numpy.mean(dirty)), 'max': int(max(dirty)),
+        'view_cells': dotd.VIEW_WIDTH * dotd.VIEW_HEIGHT}
+
+    #keep the player alive however long the monsters keep hitting
+    dotd.player.fighter.max_hp = dotd.player.fighter.hp = 10 ** 9
+    results['monster_turn'] = {}
+    results['closest_monster'] = {}
+    for count in MONSTER_COUNTS:
+        spawn_monsters(count)
+        samples = []
+        for i in range(repeat):
+            dotd.update_fov()
+            samples.append(timed(monster_turn))
+        results['monster_turn'][str(count)] = summarize(samples)
+        #auto-targeting, as the lightning spell does it
+        results['closest_monster'][str(count)] = summarize(
+            [timed(dotd.closest_monster, dotd.LIGHTNING_RANGE) for i in range(repeat)])
+
+    #with the most monsters still on the level
+    results['memory'] = memory()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark level generation, FOV, rendering and monster turns.')
+    parser.add_argument('--out', help='write the JSON results to this file instead of stdout')
+    parser.add_argument('--repeat', type=int, default=20, help='samples per measurement')
+    parser.add_argument('--scales', default='1,2,4', help='map sizes to run, as multiples of the stock 140x90 per side')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    headless.random_seed(args.seed)
+    numpy.random.seed(args.seed)
+    results = {'python': sys.version.split()[0], 'repeat': args.repeat, 'seed': args.seed, 'scales': {}}
+    for scale in [int(s) for s in args.scales.split(',')]:
+        results['scales'][str(scale)] = bench_scale(scale, args.repeat)
+
+    output = json.dumps(results, indent=2, sort_keys=True)
+    if args.out:
+        with open(args.out, 'w') as f:
+            f.write(output + '\n')
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
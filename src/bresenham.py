@@ -0,0 +1,67 @@
+import numpy
+
+#bresenham lines, walked the same way as libtcod's line_init/line_step: the
+#origin is left out and the destination is the last tile. unlike libtcod
+#there's no hidden state, so any number of lines can be walked at once.
+
+
+def line(xo, yo, xd, yd):
+    #the tiles from (xo, yo) to (xd, yd), one (x, y) at a time
+    dx = xd - xo
+    dy = yd - yo
+    sx = (dx > 0) - (dx < 0)
+    sy = (dy > 0) - (dy < 0)
+    if sx * dx > sy * dy:
+        e = sx * dx
+        while xo != xd:
+            xo += sx
+            e -= 2 * sy * dy
+            if e < 0:
+                yo += sy
+                e += 2 * sx * dx
+            yield (xo, yo)
+    else:
+        e = sy * dy
+        while yo != yd:
+            yo += sy
+            e -= 2 * sx * dx
+            if e < 0:
+                xo += sx
+                e += 2 * sy * dy
+            yield (xo, yo)
+
+
+def lines(xo, yo, xd, yd):
+    #the tiles of many lines at once. the arguments are arrays (or numbers)
+    #of the same shape, one entry per line. returns (xs, ys, valid), each
+    #[line, step]: step k of a line is (xs, ys)[line, k] while valid[line, k].
+    #shorter lines are padded up to the longest one with their destination.
+    xo = numpy.atleast_1d(numpy.asarray(xo, dtype=numpy.int32))
+    yo = numpy.atleast_1d(numpy.asarray(yo, dtype=numpy.int32))
+    dx = numpy.atleast_1d(numpy.asarray(xd, dtype=numpy.int32)) - xo
+    dy = numpy.atleast_1d(numpy.asarray(yd, dtype=numpy.int32)) - yo
+    (xo, yo, dx, dy) = numpy.broadcast_arrays(xo, yo, dx, dy)
+    (adx, ady) = (numpy.abs(dx), numpy.abs(dy))
+    x_major = adx > ady
+    major = numpy.where(x_major, adx, ady)[:, None]
+    minor = numpy.where(x_major, ady, adx)[:, None]
+    longest = int(major.max()) if major.size else 0
+    valid = numpy.arange(1, longest + 1, dtype=numpy.int32)[None, :] <= major
+    k = numpy.minimum(numpy.arange(1, longest + 1, dtype=numpy.int32)[None, :], major)
+    #the error term stays in [0, 2 * major), which pins down how many steps
+    #along the minor axis have been taken after k steps along the major one
+    num = 2 * minor * k - major
+    den = numpy.maximum(2 * major, 1)
+    minor_steps = numpy.maximum(0, -((-num) // den))
+    along_x = numpy.where(x_major[:, None], k, minor_steps)
+    along_y = numpy.where(x_major[:, None], minor_steps, k)
+    xs = xo[:, None] + numpy.sign(dx)[:, None] * along_x
+    ys = yo[:, None] + numpy.sign(dy)[:, None] * along_y
+    return (xs, ys, valid)
+
+
+def clear_lines(blocked, xo, yo, xd, yd):
+    #for each line, true if none of its tiles is blocked. blocked is a boolean
+    #[x, y] array, which the lines' ends have to be inside of
+    (xs, ys, valid) = lines(xo, yo, xd, yd)
+    return ~(blocked[xs, ys] & valid).any(axis=1)
@@ -0,0 +1,141 @@
+import numpy
+from occupancy import ObjectListener
+
+#fighter stats stored column by column: one numpy array per stat, with a row
+#per fighter on the level. a Fighter is only a view of its row, so per-turn
+#effects can work on every fighter's stats at once.
+
+STATUSES = ('war_lust', 'cursed', 'invisible')  #status effects, each with its own countdown
+STATS = ('hp', 'max_hp', 'mana', 'max_mana', 'piety', 'max_piety', 'defence', 'max_defence',
+    'power', 'max_power', 'evasion', 'max_evasion') + tuple(status + '_timer' for status in STATUSES)
+MODIFIED_STATS = ('power', 'defence', 'evasion')  #the stats that equipment and status effects change
+
+
+def stat(name):
+    #a Fighter property for one stat. a fighter that isn't on a level (yet)
+    #keeps its stats in a dict, and moves them into its row when it's placed
+    #(the dict is dropped until it leaves the level again)
+    def get(self):
+        if self.row is None:
+            return self.values[name]
+        return int(self.store.columns[name][self.row])
+
+    def set(self, value):
+        if self.row is None:
+            self.values[name] = value
+        else:
+            self.store.columns[name][self.row] = value
+    return property(get, set)
+
+
+class FighterStore(ObjectListener):
+    #the stats of the fighters on a level. it follows the level's object list:
+    #fighters get a row when they're added and give it back when they leave
+    #the level or die
+    def __init__(self, capacity=64):
+        self.columns = dict((name, numpy.zeros(capacity, dtype=numpy.int32)) for name in STATS)
+        self.active = numpy.zeros(capacity, dtype=numpy.bool_)
+        self.fighters = [None] * capacity  #row -> its Fighter
+        self.rows = {}  #object -> the row of its fighter
+        self.free = list(range(capacity - 1, -1, -1))
+
+    def __len__(self):
+        return len(self.rows)
+
+    def added(self, obj):
+        if obj.fighter:
+            self.attach(obj)
+
+    def removed(self, obj):
+        self.detach(obj)
+
+    def fighter_changed(self, obj):
+        self.detach(obj)
+        self.added(obj)
+
+    def attach(self, obj):
+        #move the stats of obj's fighter into a row
+        if not self.free:
+            self._grow()
+        fighter = obj.fighter
+        if fighter.store is not None:
+            #still in another level's store: take its stats back from there first
+            fighter.store.detach(obj)
+        row = self.free.pop()
+        for name in STATS:
+            self.columns[name][row] = fighter.values[name]
+        fighter.values = None  #the row is the only copy from now on
+        self.active[row] = True
+        self.fighters[row] = fighter
+        self.rows[obj] = row
+        (fighter.store, fighter.row) = (self, row)
+
+    def detach(self, obj):
+        #move the stats of obj's fighter out of its row, and free the row
+        row = self.rows.pop(obj, None)
+        if row is None:
+            return
+        fighter = self.fighters[row]
+        fighter.values = dict((name, int(self.columns[name][row])) for name in STATS)
+        (fighter.store, fighter.row) = (None, None)
+        self.active[row] = False
+        self.fighters[row] = None
+        self.free.append(row)
+
+    def _grow(self):
+        capacity = len(self.active)
+        for name in STATS:
+            self.columns[name] = numpy.concatenate([self.columns[name], numpy.zeros(capacity, dtype=numpy.int32)])
+        self.active = numpy.concatenate([self.active, numpy.zeros(capacity, dtype=numpy.bool_)])
+        self.fighters += [None] * capacity
+        self.free = list(range(2 * capacity - 1, capacity - 1, -1))
+
+    def tick_timers(self):
+        #count down every running status timer by a turn (a timer of 0 isn't
+        #running). returns a (fighter, status) pair for each status that just ran out
+        expired = []
+        for status in STATUSES:
+            timer = self.columns[status + '_timer']
+            running = self.active & (timer > 0)
+            timer[running] -= 1
+            expired += [(self.fighters[row], status) for row in numpy.flatnonzero(running & (timer == 0))]
+        return expired
+
+
+class ModifierStack(object):
+    #the bonuses (or penalties, when negative) to a fighter's power, defence
+    #and evasion, each from a source: a piece of equipment, a status effect...
+    #any number of sources stack. the totals are kept as they're added and
+    #removed, and each stat is set to its maximum plus the total, but never below 0
+    __slots__ = ('fighter', 'sources', 'totals')
+
+    def __init__(self, fighter):
+        self.fighter = fighter
+        self.sources = {}  #source -> (power, defence, evasion)
+        self.totals = [0] * len(MODIFIED_STATS)
+
+    def add(self, source, power=0, defence=0, evasion=0):
+        #add a source, replacing what it gave before if it was already there
+        self._take(source)
+        bonus = (power, defence, evasion)
+        self.sources[source] = bonus
+        for i in range(len(MODIFIED_STATS)):
+            self.totals[i] += bonus[i]
+        self.apply()
+
+    def remove(self, source):
+        if self._take(source):
+            self.apply()
+
+    def _take(self, source):
+        bonus = self.sources.pop(source, None)
+        if bonus is None:
+            return False
+        for i in range(len(MODIFIED_STATS)):
+            self.totals[i] -= bonus[i]
+        return True
+
+    def apply(self):
+        #set the stats from their maximum and the totals
+        for (name, total) in zip(MODIFIED_STATS, self.totals):
+            setattr(self.fighter, name, max(0, getattr(self.fighter, 'max_' + name) + total))
@@ -1,6 +1,27 @@
-import libtcodpy as libtcod
+import os
+import sys
+#run without a window when asked to, see run_headless() at the bottom.
+#DOTD_HEADLESS=0 (or unset, false...) still opens the window
+HEADLESS = os.environ.get('DOTD_HEADLESS', '').lower() in ('1', 'true', 'yes', 'on') or '--headless' in sys.argv
+if HEADLESS:
+    import headless as libtcod
+else:
+    import libtcodpy as libtcod
 import math
+from collections import namedtuple
 import textwrap
+import numpy
+import render
+import effects
+from tilemap import TileMap
+from occupancy import ObjectList, OccupancyGrid
+from scheduler import Scheduler, NORMAL_SPEED
+from spatial import FighterGrid
+from components import FighterStore, ModifierStack, STATS, stat
+import sampling
+import fov
+import pathing
+import bresenham
  
 #actual size of the window
 SCREEN_WIDTH = 80
@@ -32,6 +53,8 @@ MAX_ROOM_ITEMS = 2
 
 #ai values
 AI_INTEREST = 98 #percentage chance per turn that a monster will stay interested in player once out of sight
+WANDER_RANGE = 20 #how far away an idle monster in a corridor looks for somewhere to wander to
+WANDER_TRIES = 10 #how many spots it tries before it settles for a single step
  
 #spell values
 HEAL_AMOUNT = 10
@@ -87,9 +110,10 @@ TOTEM_EV = 15
 
 ANIMATION_FRAMES = 20 
  
-FOV_ALGO = libtcod.FOV_PERMISSIVE_8 #default FOV algorithm
+FOV_ALGO = fov.FOV_PERMISSIVE_8 #default FOV algorithm
 FOV_LIGHT_WALLS = True  #light walls or not
 TORCH_RADIUS = 10
+FLOW_RADIUS = 2 * TORCH_RADIUS  #how many moves away monsters can path towards the player
  
 LIMIT_FPS = 20  #20 frames-per-second maximum
  
@@ -99,20 +123,10 @@ color_dark_ground = libtcod.black
 color_light_ground = libtcod.darker_grey
  
 
-class Tile:
-    #a tile of the map and its properties
-    def __init__(self, blocked, block_sight = None):
-        self.blocked = blocked
- 
-        #all tiles start unexplored
-        self.explored = False
- 
-        #by default, if a tile is blocked, it also blocks sight
-        if block_sight is None: block_sight = blocked
-        self.block_sight = block_sight
- 
-class Rect:
+class Rect(object):
     #a rectangle on the map. used to characterize a room.
+    __slots__ = ('x1', 'y1', 'x2', 'y2')
+ 
     def __init__(self, x, y, w, h):
         self.x1 = x
         self.y1 = y
@@ -129,21 +143,29 @@ class Rect:
         return (self.x1 <= other.x2 and self.x2 >= other.x1 and
                 self.y1 <= other.y2 and self.y2 >= other.y1)
  
-class Object:
+#what something is and looks like: its name, and the character and color it's
+#drawn with. these are immutable and shared by everything of the same kind,
+#objects only keep what changes (position, stats, AI state...)
+Kind = namedtuple('Kind', 'name char color')
+STAIRS = Kind('stairs leading upwards', '<', libtcod.white)
+ 
+class Object(object):
     #this is a generic object: the player, a monster, an item, the stairs...
     #it's always represented by a character on screen.
-    def __init__(self, x, y, char, name, color, blocks=False, fighter=None, ai=None, item=None):
-        self.x = x
-        self.y = y
-        self.char = char
-        self.name = name
-        self.color = color
-        self.blocks = blocks
-        self.fighter = fighter
+    #__slots__ keeps them small, there can be a lot of them on a level
+    __slots__ = ('container', '_x', '_y', 'kind', '_blocks', '_fighter', '_ai', 'item', '_layer')
+ 
+    def __init__(self, x, y, kind, blocks=False, fighter=None, ai=None, item=None, layer=None):
+        self.container = None  #the level's object list, once it's placed on one
+        self._x = x
+        self._y = y
+        self.kind = kind  #a Kind, MonsterTemplate or ItemTemplate
+        self._blocks = blocks
+        self._fighter = fighter
         if self.fighter:  #let the fighter component know who owns it
             self.fighter.owner = self
  
-        self.ai = ai
+        self._ai = ai
         if self.ai:  #let the AI component know who owns it
             self.ai.owner = self
  
@@ -151,6 +173,83 @@ class Object:
         if self.item:  #let the Item component know who owns it
             self.item.owner = self
  
+        #the render layer decides what it's drawn over. by default fighters
+        #are actors, items are items and anything else is a floor decal
+        if layer is None:
+            if fighter:
+                layer = render.ACTOR
+            elif item:
+                layer = render.ITEM
+            else:
+                layer = render.DECAL
+        self._layer = layer
+ 
+    #position, blocking, fighter, AI and layer are properties, so that the level's
+    #object list can keep its indexes of who stands where, its turn order and
+    #its render layers up to date
+    def get_x(self):
+        return self._x
+ 
+    def set_x(self, x):
+        old_x = self._x
+        self._x = x
+        if self.container is not None:
+            self.container.object_moved(self, old_x, self._y)
+ 
+    def get_y(self):
+        return self._y
+ 
+    def set_y(self, y):
+        old_y = self._y
+        self._y = y
+        if self.container is not None:
+            self.container.object_moved(self, self._x, old_y)
+ 
+    def get_blocks(self):
+        return self._blocks
+ 
+    def set_blocks(self, blocks):
+        if blocks != self._blocks:
+            self._blocks = blocks
+            if self.container is not None:
+                self.container.object_blocks_changed(self)
+ 
+    def get_fighter(self):
+        return self._fighter
+ 
+    def set_fighter(self, fighter):
+        self._fighter = fighter
+        if self.container is not None:
+            self.container.object_fighter_changed(self)
+ 
+    def get_ai(self):
+        return self._ai
+ 
+    def set_ai(self, ai):
+        self._ai = ai
+        if self.container is not None:
+            self.container.object_ai_changed(self)
+ 
+    def get_layer(self):
+        return self._layer
+ 
+    def set_layer(self, layer):
+        self._layer = layer
+        if self.container is not None:
+            self.container.object_layer_changed(self)
+ 
+    x = property(get_x, set_x)
+    y = property(get_y, set_y)
+    blocks = property(get_blocks, set_blocks)
+    fighter = property(get_fighter, set_fighter)
+    ai = property(get_ai, set_ai)
+    layer = property(get_layer, set_layer)
+ 
+    #the looks come from the kind. to change them, give the object another kind
+    name = property(lambda self: self.kind.name)
+    char = property(lambda self: self.kind.char)
+    color = property(lambda self: self.kind.color)
+ 
     def move(self, dx, dy):
         #move by the given amount, if the destination is not blocked
         if not is_blocked(self.x + dx, self.y + dy):
@@ -181,6 +280,15 @@ class Object:
                 if not is_blocked(self.x, self.y + ddy):
                     self.move(0, ddy)
                     return
+
+    def move_along(self, field):
+        #take the best step towards the field's goal, or head straight for it
+        #if the field doesn't reach this far
+        step = field.step_from(self.x, self.y, is_blocked)
+        if step is None:
+            self.move_towards(field.x, field.y)
+        elif step != (0, 0):
+            self.move(*step)
         
     def distance_to(self, other):
         #return the distance to another object
@@ -192,37 +300,24 @@ class Object:
         #return the distance to some coordinates
         return math.sqrt((x - self.x) ** 2 + (y - self.y) ** 2)
  
-    def send_to_back(self):
-        #make this object be drawn first, so all others appear above it if they're in the same tile.
-        global objects
-        objects.remove(self)
-        objects.insert(0, self)
- 
-    def send_to_front(self):
-        #make this object be drawn last, so it appears above all other objects in the same tile.
-        global objects
-        objects.remove(self)
-        objects.append(self)
- 
     def draw(self):
         #only show if it's visible to the player
-        if libtcod.map_is_in_fov(fov_map, self.x, self.y):
-            #set the color and then draw the character that represents this object at its position
+        if fov_map.is_in_fov(self.x, self.y):
+            #draw the character that represents this object at its position, in its color
             vx = player.x - self.x + (VIEW_WIDTH / 2)
             vy = player.y - self.y + (VIEW_HEIGHT / 2)
-            libtcod.console_set_foreground_color(con, self.color)
-            libtcod.console_put_char(con, vx, vy, self.char, libtcod.BKGND_NONE)
- 
-    def clear(self):
-        #erase the character that represents this object
-        vx = player.x - self.x + (VIEW_WIDTH / 2)
-        vy = player.y - self.y + (VIEW_HEIGHT / 2)
-        libtcod.console_put_char(con, vx, vy, ' ', libtcod.BKGND_NONE)
+            frame.put(vx, vy, self.char, self.color)
  
  
-class Fighter:
+class Fighter(object):
     #combat-related properties and methods (monster, player, NPC).
-    def __init__(self, hp, mana, piety, defence, power, evasion, death_function=None, timer = 0, status_effect=None):
+    #the stats live in the level's FighterStore, see components.py
+    __slots__ = ('store', 'row', 'values', 'modifiers', 'death_function', 'speed', 'owner')
+ 
+    def __init__(self, hp, mana, piety, defence, power, evasion, death_function=None, speed=NORMAL_SPEED):
+        self.store = None
+        self.row = None
+        self.values = dict.fromkeys(STATS, 0)
         self.max_hp = hp
         self.hp = hp
         self.max_mana = mana
@@ -236,8 +331,28 @@ class Fighter:
         self.max_evasion = evasion
         self.evasion = evasion
         self.death_function = death_function
-        self.timer = timer
-        self.status_effect = status_effect
+        self.speed = speed  #how often it acts, NORMAL_SPEED is once per player turn
+        self.modifiers = ModifierStack(self)  #equipment and status effects on power, defence and evasion
+ 
+    #the stats are views of the fighter's row in the store
+    hp = stat('hp')
+    max_hp = stat('max_hp')
+    mana = stat('mana')
+    max_mana = stat('max_mana')
+    piety = stat('piety')
+    max_piety = stat('max_piety')
+    defence = stat('defence')
+    max_defence = stat('max_defence')
+    power = stat('power')
+    max_power = stat('max_power')
+    evasion = stat('evasion')
+    max_evasion = stat('max_evasion')
+    war_lust_timer = stat('war_lust_timer')
+    cursed_timer = stat('cursed_timer')
+    invisible_timer = stat('invisible_timer')
+ 
+    def has_status(self, effect):
+        return effect in self.modifiers.sources
  
     def attack(self, target):
         #a simple formula for attack damage
@@ -290,20 +405,50 @@ class Fighter:
         #use piety by the given amount
         self.piety -= amount
         
-class BasicMonster:
-    memory_x = None
-    memory_y = None
-        
+class MonsterTemplate(namedtuple('MonsterTemplate', 'name char color hp mana piety defence power evasion death_function corpse')):
+    #the kind of a monster: its looks, starting stats and what it leaves
+    #behind when it dies. spawning one makes an object of this kind
+    __slots__ = ()
+ 
+    def __new__(cls, name, char, color, hp, mana, piety, defence, power, evasion, death_function=None):
+        corpse = Kind('remains of ' + name, '%', libtcod.red)
+        return super(MonsterTemplate, cls).__new__(cls, name, char, color, hp, mana, piety, defence, power, evasion,
+            death_function, corpse)
+ 
+    def spawn(self, x, y):
+        fighter_component = Fighter(hp=self.hp, mana=self.mana, piety=self.piety, defence=self.defence,
+            power=self.power, evasion=self.evasion, death_function=self.death_function)
+        return Object(x, y, self, blocks=True, fighter=fighter_component, ai=BasicMonster())
+ 
+class ItemTemplate(namedtuple('ItemTemplate', 'name char color use_function equip_type power defence evasion')):
+    #the kind of an item: its looks and what it does. the Item component of
+    #every item of this kind reads it from here
+    __slots__ = ()
+ 
+    def __new__(cls, name, char, color, use_function=None, equip_type=None, power=None, defence=None, evasion=None):
+        return super(ItemTemplate, cls).__new__(cls, name, char, color, use_function, equip_type, power, defence, evasion)
+ 
+    def spawn(self, x, y):
+        return Object(x, y, self, item=Item())
+ 
+class BasicMonster(object):
     #AI for a basic monster.
+    __slots__ = ('memory_x', 'memory_y', 'owner')
+ 
+    def __init__(self):
+        #where it last saw the player, or where it's wandering to
+        self.memory_x = None
+        self.memory_y = None
+ 
     def take_turn(self):
         #a basic monster takes its turn. if you can see it, it can see you
         monster = self.owner
-        if libtcod.map_is_in_fov(fov_map, monster.x, monster.y) and player.fighter.status_effect != 'invisible':
+        if fov_map.is_in_fov(monster.x, monster.y) and not player.fighter.has_status('invisible'):
             self.memory_x = player.x
             self.memory_y = player.y
             #move towards player if far away
             if monster.distance_to(player) >= 2:
-                monster.move_towards(player.x, player.y)
+                monster.move_along(player_flow())
  
             #close enough, attack! (if the player is still alive.)
             elif player.fighter.hp > 0:
@@ -314,15 +459,12 @@ class BasicMonster:
                 self.memory_x = None
                 self.memory_y = None
         else: #fake a memory so the monster wanders to location in line of sight
-            while True:
-                x = libtcod.random_get_int(0, monster.x - 20, monster.x + 20)
-                y = libtcod.random_get_int(0, monster.y - 20, monster.y + 20)
-                if can_walk_between(monster.x, monster.y, x, y): break
-            self.memory_x = x
-            self.memory_y = y
- 
-class ConfusedMonster:
+            (self.memory_x, self.memory_y) = wander_target(monster.x, monster.y)
+ 
+class ConfusedMonster(object):
     #AI for a temporarily confused monster (reverts to previous AI after a while).
+    __slots__ = ('old_ai', 'num_turns', 'owner')
+ 
     def __init__(self, old_ai, num_turns=CONFUSE_NUM_TURNS):
         self.old_ai = old_ai
         self.num_turns = num_turns
@@ -338,15 +480,17 @@ class ConfusedMonster:
             message('The ' + self.owner.name + ' is no longer confused!', libtcod.red)
  
  
-class Item:
+class Item(object):
 
-    #an item that can be picked up and used or equipped.
-    def __init__(self, use_function=None, equip_type=None, power=None, defence=None, evasion=None):
-        self.use_function = use_function
-        self.equip_type = equip_type
-        self.power = power
-        self.defence = defence
-        self.evasion = evasion
+    #an item that can be picked up and used or equipped. what it does comes
+    #from its owner's ItemTemplate
+    __slots__ = ('owner',)
+ 
+    use_function = property(lambda self: self.owner.kind.use_function)
+    equip_type = property(lambda self: self.owner.kind.equip_type)
+    power = property(lambda self: self.owner.kind.power)
+    defence = property(lambda self: self.owner.kind.defence)
+    evasion = property(lambda self: self.owner.kind.evasion)
  
     def pick_up(self):
         #add to the player's inventory and remove from the map
@@ -383,7 +527,6 @@ class Item:
             weapon = self.owner
             inventory.remove(self.owner)
             message('You wield a ' + self.owner.name + '.', libtcod.red)
-            calc_stats()
         
         if self.equip_type == 'armour':
             if armour != None:
@@ -393,20 +536,21 @@ class Item:
             armour = self.owner
             inventory.remove(self.owner)
             message('You put on the ' + self.owner.name + '.', libtcod.red)
-            calc_stats()
 
         if self.equip_type == 'jewellery':
             if jewellery != None:
                 inventory.append(jewellery)
                 message('You take off the ' + jewellery.name + '.', libtcod.red)
-                armour = None                
+                jewellery = None                
             jewellery = self.owner
             inventory.remove(self.owner)
             message('You put on the ' + self.owner.name + '.', libtcod.red)
-            calc_stats()
             
         if self.equip_type is None:
             message('The ' + self.owner.name + ' cannot be equipped.')
+        else:
+            #each slot is one source of bonuses, so this replaces what was there
+            player.fighter.modifiers.add(self.equip_type, self.power or 0, self.defence or 0, self.evasion or 0)
 
     def remove(self):
         global weapon, armour, jewellery
@@ -414,110 +558,109 @@ class Item:
             inventory.append(self.owner)
             weapon = None
             message('You put away the ' + self.owner.name + '.', libtcod.red)
-            calc_stats()
         
         if self.equip_type == 'armour':
             inventory.append(self.owner)
             armour = None
             message('You take off the ' + self.owner.name + '.', libtcod.red)
-            calc_stats()
             
         if self.equip_type == 'jewellery':
             inventory.append(self.owner)
             jewellery = None
             message('You take off the ' + self.owner.name + '.', libtcod.red)
-            calc_stats()
+        player.fighter.modifiers.remove(self.equip_type)
                 
 def can_walk_between(x1, y1, x2, y2):
-    libtcod.line_init(x1, y1, x2, y2)
-    test = True
-    while True:
-        (x, y) = libtcod.line_step()
-        if x is None: break
-        
+    for (x, y) in bresenham.line(x1, y1, x2, y2):
         if is_blocked(x, y): 
-            test = False
-            break
-    return test        
+            return False
+    return True
         
+def wander_target(x, y):
+    #somewhere in line of sight for an idle monster at (x, y) to wander to.
+    #rooms are open rectangles, so in a room any free tile of it will do;
+    #in a corridor a few random spots are tried. either way there's a limit
+    #to the tries, after which it just takes a step to a free neighbor
+    room = map.room_at(x, y)
+    for i in range(WANDER_TRIES):
+        if room is not None:
+            (x1, x2, y1, y2) = room
+            tx = libtcod.random_get_int(0, x1, x2 - 1)
+            ty = libtcod.random_get_int(0, y1, y2 - 1)
+            if not is_blocked(tx, ty):
+                return (tx, ty)
+        else:
+            tx = libtcod.random_get_int(0, x - WANDER_RANGE, x + WANDER_RANGE)
+            ty = libtcod.random_get_int(0, y - WANDER_RANGE, y + WANDER_RANGE)
+            if (0 <= tx < MAP_WIDTH and 0 <= ty < MAP_HEIGHT and not map.blocked[tx, ty]
+                    and can_walk_between(x, y, tx, ty)):
+                return (tx, ty)
+    steps = [(x + dx, y + dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if not is_blocked(x + dx, y + dy)]
+    if steps:
+        return steps[libtcod.random_get_int(0, 0, len(steps) - 1)]
+    return (x, y)  #boxed in, stay put
                 
-def calc_stats():
-    player.fighter.power = player.fighter.max_power
-    if weapon != None:
-        player.fighter.power = player.fighter.power + weapon.item.power
-    if jewellery != None:
-        if jewellery.item.power != None:
-            player.fighter.power = player.fighter.power + jewellery.item.power
+#what each status effect does to power, defence and evasion
+STATUS_MODIFIERS = {
+    'war_lust': (WAR_LUST_POWER_BONUS, WAR_LUST_DEFENCE_BONUS, WAR_LUST_EV_BONUS),
+    'cursed': (CURSE_POWER_EFFECT, CURSE_DEFENCE_EFFECT, CURSE_EV_EFFECT),
+    'invisible': (0, 0, 0)}
 
-    player.fighter.defence = player.fighter.max_defence
-    if armour != None:
-        player.fighter.defence = player.fighter.defence + armour.item.defence
-    if jewellery != None:
-        if jewellery.item.defence != None:
-            player.fighter.defence = player.fighter.defence + jewellery.item.defence
-            
-    player.fighter.evasion = player.fighter.max_evasion
-    if armour != None:
-        player.fighter.evasion = player.fighter.evasion + armour.item.evasion
-    if jewellery != None:
-        if jewellery.item.evasion != None:
-            player.fighter.evasion = player.fighter.evasion + jewellery.item.evasion
+def add_status(fighter, effect, turns=0):
+    #give a fighter a status effect for some turns, or for good if turns is 0.
+    #different effects stack with each other and with its equipment; the
+    #same effect again only restarts its countdown
+    fighter.modifiers.add(effect, *STATUS_MODIFIERS[effect])
+    setattr(fighter, effect + '_timer', turns)
 
-    if player.fighter.status_effect == 'war_lust':
-        player.fighter.power = player.fighter.power + WAR_LUST_POWER_BONUS
-        player.fighter.defence = player.fighter.defence + WAR_LUST_DEFENCE_BONUS
-        player.fighter.evasion = player.fighter.evasion + WAR_LUST_EV_BONUS
-        
-    if player.fighter.status_effect == 'cursed':
-        player.fighter.power = player.fighter.power + CURSE_POWER_EFFECT
-        player.fighter.defence = player.fighter.defence + CURSE_DEFENCE_EFFECT
-        player.fighter.evasion = player.fighter.evasion + CURSE_EV_EFFECT    
-        
-    if player.fighter.power < 0: player.fighter.power = 0
-    if player.fighter.defence < 0: player.fighter.defence = 0
-    if player.fighter.evasion < 0: player.fighter.evasion = 0
+def end_status(fighter, effect):
+    fighter.modifiers.remove(effect)
+    setattr(fighter, effect + '_timer', 0)
             
 def is_blocked(x, y):
     #first test the map tile
-    if map[x][y].blocked:
+    if map.blocked[x, y]:
         return True
  
     #now check for any blocking objects
-    for object in objects:
-        if object.blocks and object.x == x and object.y == y:
-            return True
- 
-    return False
+    return occupancy.is_blocked(x, y)
+ 
+def new_level_objects():
+    global objects, occupancy, scheduler, fighters, fighter_stats, layers, decals, corpses
+    #start an empty level holding only the player. the occupancy grid
+    #follows every object added to, moved on or removed from the level,
+    #the scheduler every monster that can act, the fighter grid and the
+    #fighter stats every live fighter, and the render layers everything.
+    #corpses aren't objects, they go in the decal map
+    occupancy = OccupancyGrid(MAP_WIDTH, MAP_HEIGHT)
+    scheduler = Scheduler()
+    fighters = FighterGrid()
+    fighter_stats = FighterStore()
+    layers = render.RenderLayers()
+    objects = ObjectList([occupancy, scheduler, fighters, fighter_stats, layers], [player])
+    decals = render.DecalMap(MAP_WIDTH, MAP_HEIGHT)
+    corpses = 0  #monsters on this level taken out of "objects" for a decal
  
 def create_room(room):
     global map
-    #go through the tiles in the rectangle and make them passable
-    for x in range(room.x1 + 1, room.x2):
-        for y in range(room.y1 + 1, room.y2):
-            map[x][y].blocked = False
-            map[x][y].block_sight = False
+    #make the tiles in the rectangle passable, and note them down as a room
+    map.add_room(room.x1 + 1, room.x2, room.y1 + 1, room.y2)
  
 def create_h_tunnel(x1, x2, y):
     global map
     #horizontal tunnel. min() and max() are used in case x1>x2
-    for x in range(min(x1, x2), max(x1, x2) + 1):
-        map[x][y].blocked = False
-        map[x][y].block_sight = False
+    map.carve(min(x1, x2), max(x1, x2) + 1, y, y + 1)
  
 def create_v_tunnel(y1, y2, x):
     global map
     #vertical tunnel
-    for y in range(min(y1, y2), max(y1, y2) + 1):
-        map[x][y].blocked = False
-        map[x][y].block_sight = False
+    map.carve(x, x + 1, min(y1, y2), max(y1, y2) + 1)
     
 def make_map():
     global map, player
     
     #fill map with "blocked" tiles
-    map = [[ Tile(True)
-        for y in range(MAP_HEIGHT) ]
-            for x in range(MAP_WIDTH) ]
+    map = TileMap(MAP_WIDTH, MAP_HEIGHT)
  
     rooms = []
     num_rooms = 0
@@ -546,9 +689,6 @@ def make_map():
             #"paint" it to the map's tiles
             create_room(new_room)
  
-            #add some contents to this room, such as monsters
-            place_objects(new_room)
- 
             #center coordinates of new room, will be useful later
             (new_x, new_y) = new_room.center()
  
@@ -577,11 +717,14 @@ def make_map():
             rooms.append(new_room)
             num_rooms += 1
             
+    #add some contents to the rooms, such as monsters
+    populate_rooms(rooms)
+ 
     #and then place stairs to the next level somewhere in the center of a room!
     if level < 5:
         end_room = libtcod.random_get_int(0, 0, len(rooms) - 1)
         (stair_x, stair_y) = rooms[end_room].center()
-        stairs = Object(stair_x, stair_y, '<', 'stairs leading upwards', libtcod.white, False)
+        stairs = Object(stair_x, stair_y, STAIRS, False)
         objects.append(stairs)
         
     #place the boss for that level!
@@ -589,224 +732,78 @@ def make_map():
     monster = create_leader()
     objects.append(monster)    
   
-def place_objects(room):
-    #choose random number of monsters
-    num_monsters = libtcod.random_get_int(0, 0, MAX_ROOM_MONSTERS)
- 
-    for i in range(num_monsters):
-        #choose random spot for this monster
-        x = libtcod.random_get_int(0, room.x1+1, room.x2-1)
-        y = libtcod.random_get_int(0, room.y1+1, room.y2-1)
- 
-        #only place it if the tile is not blocked
-        if not is_blocked(x, y) and x != player.x and y != player.y:
-            monster_type = libtcod.random_get_int(0, 0, 100)
-            if monster_type < 20:
-                monster = create_halfling(x, y)
-            
-            elif monster_type < 40:
-                monster = create_gnome(x, y)
-            
-            elif monster_type < 60:
-                monster = create_dwarf(x, y)
-            
-            elif monster_type < 80:
-                monster = create_elf(x, y)
-            
-            else:
-                monster = create_human(x, y)
-            
-            objects.append(monster)
- 
-    #choose random number of items
-    num_items = libtcod.random_get_int(0, 0, MAX_ROOM_ITEMS)
- 
-    for i in range(num_items):
-        #choose random spot for this item
-        x = libtcod.random_get_int(0, room.x1+1, room.x2-1)
-        y = libtcod.random_get_int(0, room.y1+1, room.y2-1)
- 
-        #only place it if the tile is not blocked
-        if not is_blocked(x, y):
-            dice = libtcod.random_get_int(0, 0, 100)
-            if dice < 30:
-                #create a healing potion
-                item_component = Item(use_function=cast_heal)
-                item = Object(x, y, '!', 'healing potion', libtcod.yellow, item=item_component)
-                
-            elif dice < 30+20:
-                #create a mana potion
-                item_component = Item(use_function=cast_restore_mana)
-                item = Object(x, y, '!', 'mana potion', libtcod.light_violet, item=item_component)
-
-            elif dice < 50+5:
-                #create a lightning bolt scroll
-                item_component = Item(use_function=cast_lightning)
-                item = Object(x, y, '?', 'scroll of lightning bolt', libtcod.white, item=item_component)
- 
-            elif dice < 55+5:
-                #create a fireball scroll
-                item_component = Item(use_function=cast_fireball) 
-                item = Object(x, y, '?', 'scroll of fireball', libtcod.red, item=item_component)
-                
-            elif dice < 60+5:
-                #create a confuse scroll
-                item_component = Item(use_function=cast_confuse) 
-                item = Object(x, y, '?', 'scroll of confusion', libtcod.green, item=item_component)
-
-            elif dice < 65+5:
-                #create an acid arrow scroll
-                item_component = Item(use_function=cast_acid_arrow) 
-                item = Object(x, y, '?', 'scroll of acid arrow', libtcod.light_chartreuse, item=item_component)
+def populate_rooms(rooms):
+    #fill all the rooms with monsters and items in one pass: pick every spot
+    #first, then spawn all the monsters and all the items in a batch each
+    monster_spots = []
+    item_spots = []
+    for room in rooms:
+        #choose random number of monsters
+        num_monsters = libtcod.random_get_int(0, 0, MAX_ROOM_MONSTERS)
+        spots = []
+        for i in range(num_monsters):
+            #choose random spot for this monster
+            x = libtcod.random_get_int(0, room.x1+1, room.x2-1)
+            y = libtcod.random_get_int(0, room.y1+1, room.y2-1)
+ 
+            #only place it if the tile is not blocked
+            if not is_blocked(x, y) and x != player.x and y != player.y and (x, y) not in spots:
+                spots.append((x, y))
+        monster_spots += spots
+ 
+        #choose random number of items
+        num_items = libtcod.random_get_int(0, 0, MAX_ROOM_ITEMS)
+        for i in range(num_items):
+            #choose random spot for this item, not under a monster
+            x = libtcod.random_get_int(0, room.x1+1, room.x2-1)
+            y = libtcod.random_get_int(0, room.y1+1, room.y2-1)
+            if not is_blocked(x, y) and (x, y) not in spots:
+                item_spots.append((x, y))
+    spawn_monsters(monster_spots)
+    spawn_items(item_spots)
+ 
+def spawn_table(level):
+    #the chances of each kind of monster on a level, compiled into a table the first time
+    if level not in spawn_tables:
+        #a race is picked first, then it rolls a strength dice that goes up with
+        #the level. each kind's weight is its race's weight times the number of
+        #dice rolls that give it, over the dice's span. to keep the weights
+        #whole numbers they're all multiplied by the product of the spans
+        dice = [(level * lowest, level * 4 + 5) for (race_weight, lowest, race_kinds) in MONSTER_RACES]
+        scale = 1
+        for (low, high) in dice:
+            scale *= high - low + 1
+        kinds = []
+        weights = []
+        for ((race_weight, lowest, race_kinds), (low, high)) in zip(MONSTER_RACES, dice):
+            bounds = [low] + MONSTER_TIER_LIMITS + [high + 1]
+            for (tier, kind) in enumerate(race_kinds):
+                rolls = max(0, min(bounds[tier + 1], high + 1) - max(bounds[tier], low))
+                kinds.append(kind)
+                weights.append(race_weight * rolls * scale // (high - low + 1))
+        spawn_tables[level] = sampling.CumulativeTable(kinds, weights)
+    return spawn_tables[level]
 
-            elif dice < 70+5:
-                #create a magic missle scroll
-                item_component = Item(use_function=cast_magic_missle) 
-                item = Object(x, y, '?', 'scroll of magic missle', libtcod.light_magenta, item=item_component)
-
-            elif dice < 75 + 5:
-                #create a blink scroll
-                item_component = Item(use_function=cast_blink) 
-                item = Object(x, y, '?', 'scroll of blink', libtcod.cyan, item=item_component)
-
-            elif dice < 80 + 2:
-                #create a club
-                item_component = Item(equip_type='weapon', power = CLUB_POWER) 
-                item = Object(x, y, ')', 'club', libtcod.light_orange, item=item_component)
-                
-            elif dice < 82 + 2:
-                #create a dagger
-                item_component = Item(equip_type='weapon', power = DAGGER_POWER) 
-                item = Object(x, y, ')', 'dagger', libtcod.light_sky, item=item_component)
-
-            elif dice < 84 + 2:
-                #create a short sword
-                item_component = Item(equip_type='weapon', power = SHORT_SWORD_POWER) 
-                item = Object(x, y, ')', 'short sword', libtcod.sky, item=item_component)
-                
-            elif dice < 86 + 2:
-                #create a mace
-                item_component = Item(equip_type='weapon', power = MACE_POWER) 
-                item = Object(x, y, ')', 'mace', libtcod.light_blue, item=item_component)
-                
-            elif dice < 88 + 2:
-                #create a axe
-                item_component = Item(equip_type='weapon', power = AXE_POWER) 
-                item = Object(x, y, ')', 'axe', libtcod.cyan, item=item_component)
-                
-            elif dice < 90 + 2:
-                #create filthy rags
-                item_component = Item(equip_type='armour', defence = RAGS_DEFENCE, evasion = RAGS_EV) 
-                item = Object(x, y, ']', 'filthy tunic', libtcod.light_red, item=item_component)
-
-            elif dice < 92 + 2:
-                #create a leather armour
-                item_component = Item(equip_type='armour', defence = LEATHER_DEFENCE, evasion = LEATHER_EV) 
-                item = Object(x, y, ']', 'leather armour', libtcod.orange, item=item_component)
-
-            elif dice < 94 + 2:
-                #create a ring mail
-                item_component = Item(equip_type='armour', defence = RING_MAIL_DEFENCE, evasion = RING_MAIL_EV) 
-                item = Object(x, y, ']', 'ring mail armour', libtcod.light_blue, item=item_component)
-
-            elif dice < 96 + 2:
-                #create a chain mail
-                item_component = Item(equip_type='armour', defence = CHAIN_MAIL_DEFENCE, evasion = CHAIN_MAIL_EV) 
-                item = Object(x, y, ']', 'chain mail armour', libtcod.sky, item=item_component)
-    
-            else:
-                #create a plate armour
-                item_component = Item(equip_type='armour', defence = PLATE_MAIL_DEFENCE, evasion = PLATE_MAIL_EV) 
-                item = Object(x, y, ']', 'plate mail armour', libtcod.blue, item=item_component)
-                
-            objects.append(item)
-            item.send_to_back()  #items appear below other objects
- 
-def create_halfling(x, y):
-    #create an halfling
-    dice = libtcod.random_get_int(0, level, level * 4 + 5) #formula to try and distribute monster strength based on level
-    if dice < 8:
-        fighter_component = Fighter(hp=6, mana = 10, piety = 10, defence=5, power=5, evasion=15, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'h', 'halfling forager', libtcod.yellow, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif dice < 16:
-        fighter_component = Fighter(hp=9, mana = 10, piety = 10, defence=7, power=7, evasion=18, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'h', 'halfling thug', libtcod.green, blocks=True, fighter=fighter_component, ai=ai_component)
-    else:
-        fighter_component = Fighter(hp=12, mana = 10, piety = 10, defence=9, power=9, evasion=21, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'h', 'halfling warden', libtcod.light_blue, blocks=True, fighter=fighter_component, ai=ai_component)
-    return monster
-
-def create_gnome(x, y):
-    #create a gnome
-    dice = libtcod.random_get_int(0, level * 2, level * 4 + 5) #formula to try and distribute monster strength based on level
-    if dice < 8:
-        fighter_component = Fighter(hp=10, mana = 15, piety = 15, defence=7, power=7, evasion=10, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'g', 'gnome worker', libtcod.yellow, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif dice < 16:
-        fighter_component = Fighter(hp=13, mana = 15, piety = 15, defence=9, power=9, evasion=12, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'g', 'gnome sapper', libtcod.green, blocks=True, fighter=fighter_component, ai=ai_component)
-    else:
-        fighter_component = Fighter(hp=16, mana = 15, piety = 15, defence=11, power=11, evasion=14, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'g', 'gnome guard', libtcod.light_blue, blocks=True, fighter=fighter_component, ai=ai_component)
-    return monster
-    
-def create_dwarf(x, y):
-    #create a dwarf
-    dice = libtcod.random_get_int(0, level * 2, level * 4 + 5) #formula to try and distribute monster strength based on level
-    if dice < 8:
-        fighter_component = Fighter(hp=13, mana = 5, piety = 10, defence=15, power=15, evasion=5, death_function=monster_death)
-        ai_component = BasicMonster() 
-        monster = Object(x, y, 'd', 'dwarf miner', libtcod.yellow, blocks=True, fighter=fighter_component, ai=ai_component)    
-    elif dice < 16:
-        fighter_component = Fighter(hp=17, mana = 5, piety = 10, defence=18, power=17, evasion=5, death_function=monster_death)
-        ai_component = BasicMonster() 
-        monster = Object(x, y, 'd', 'dwarf brute', libtcod.green, blocks=True, fighter=fighter_component, ai=ai_component)    
-    else:
-        fighter_component = Fighter(hp=21, mana = 5, piety = 10, defence=21, power=19, evasion=5, death_function=monster_death)
-        ai_component = BasicMonster() 
-        monster = Object(x, y, 'd', 'dwarf knight', libtcod.light_blue, blocks=True, fighter=fighter_component, ai=ai_component)    
-    return monster
-
-def create_elf(x, y):
-    #create a elf
-    dice = libtcod.random_get_int(0, level * 2, level * 4 + 5) #formula to try and distribute monster strength based on level
-    if dice < 8:
-        fighter_component = Fighter(hp=8, mana = 15, piety = 15, defence=5, power=7, evasion=15, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'e', 'elf scout', libtcod.yellow, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif dice < 16:
-        fighter_component = Fighter(hp=11, mana = 15, piety = 15, defence=7, power=9, evasion=18, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'e', 'elf hunter', libtcod.green, blocks=True, fighter=fighter_component, ai=ai_component)
-    else:
-        fighter_component = Fighter(hp=14, mana = 15, piety = 15, defence=9, power=11, evasion=21, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'e', 'elf duellist', libtcod.light_blue, blocks=True, fighter=fighter_component, ai=ai_component)
-    return monster
-    
-def create_human(x, y):
-    #create a human
-    dice = libtcod.random_get_int(0, level * 2, level * 4 + 5) #formula to try and distribute monster strength based on level
-    if dice < 8:
-        fighter_component = Fighter(hp=12, mana = 10, piety = 10, defence=10, power=10, evasion=10, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'H', 'human recruit', libtcod.yellow, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif dice < 16:
-        fighter_component = Fighter(hp=16, mana = 10, piety = 10, defence=12, power=12, evasion=12, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'H', 'human soldier', libtcod.green, blocks=True, fighter=fighter_component, ai=ai_component)
-    else:
-        fighter_component = Fighter(hp=20, mana = 10, piety = 10, defence=14, power=14, evasion=14, death_function=monster_death)
-        ai_component = BasicMonster()
-        monster = Object(x, y, 'H', 'human paladin', libtcod.light_blue, blocks=True, fighter=fighter_component, ai=ai_component)
-    return monster
-    
+def spawn_monsters(spots):
+    #spawn monsters on all those (x, y) spots at once: one roll each on the level's table
+    table = spawn_table(level)
+    rolls = [libtcod.random_get_int(0, 0, table.total - 1) for spot in spots]
+    for ((x, y), kind) in zip(spots, table.pick_many(rolls)):
+        objects.append(kind.spawn(x, y))
+ 
+def loot_table(level):
+    #the chances of each item on a level, compiled into an alias table the first time
+    if level not in loot_tables:
+        loot_tables[level] = sampling.AliasTable([kind for (kind, weight) in ITEMS], [weight for (kind, weight) in ITEMS])
+    return loot_tables[level]
+ 
+def spawn_items(spots):
+    #place items on all those (x, y) spots at once: one roll each on the level's table
+    table = loot_table(level)
+    rolls = [libtcod.random_get_int(0, 0, table.total - 1) for spot in spots]
+    for ((x, y), kind) in zip(spots, table.pick_many(rolls)):
+        objects.append(kind.spawn(x, y))  #on the item layer, below monsters
+ 
 def create_leader():
     global level
     leader_x = 0
@@ -815,32 +812,7 @@ def create_leader():
         leader_x = libtcod.random_get_int(0, 1, MAP_WIDTH-1)
         leader_y = libtcod.random_get_int(0, 1, MAP_HEIGHT-1)
  
-    if level == 1:
-        #create a halfling leader
-        fighter_component = Fighter(hp=16, mana = 10, piety = 10, defence=10, power=10, evasion=25, death_function=leader_death)
-        ai_component = BasicMonster()
-        monster = Object(leader_x, leader_y, 'h', 'halfling elder', libtcod.red, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif level == 2:
-        #create a gnome leader
-        fighter_component = Fighter(hp=24, mana = 15, piety = 15, defence=14, power=14, evasion=10, death_function=leader_death)
-        ai_component = BasicMonster()
-        monster = Object(leader_x, leader_y, 'g', 'gnome sergeant', libtcod.red, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif level == 3:
-        #create an elf leader
-        fighter_component = Fighter(hp=20, mana = 15, piety = 15, defence=10, power=10, evasion=30, death_function=leader_death)
-        ai_component = BasicMonster()
-        monster = Object(leader_x, leader_y, 'e', 'elf captain', libtcod.red, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif level == 4:
-        #create a dwarf leader
-        fighter_component = Fighter(hp=32, mana = 5, piety = 10, defence=30, power=30, evasion=5, death_function=leader_death)
-        ai_component = BasicMonster() 
-        monster = Object(leader_x, leader_y, 'd', 'dwarf warleader', libtcod.red, blocks=True, fighter=fighter_component, ai=ai_component)
-    elif level == 5:
-        #create a human leader
-        fighter_component = Fighter(hp=28, mana = 10, piety = 10, defence=20, power=20, evasion=20, death_function=victory_death)
-        ai_component = BasicMonster()
-        monster = Object(leader_x, leader_y, 'H', 'human general', libtcod.red, blocks=True, fighter=fighter_component, ai=ai_component)
-    return monster
+    return LEADERS[level].spawn(leader_x, leader_y)
     
 def render_bar(x, y, total_width, name, value, maximum, bar_color, back_color):
     #render a bar (HP, experience, etc). first calculate the width of the bar
@@ -865,69 +837,76 @@ def get_names_under_mouse():
     mouse = libtcod.mouse_get_status()
     (x, y) = (mouse.cx, mouse.cy)
  
-    #create a list with the names of all objects at the mouse's coordinates and in FOV
-    names = [obj.name for obj in objects
-        if player.x - obj.x + VIEW_WIDTH / 2 == x and player.y - obj.y + VIEW_HEIGHT / 2 == y and libtcod.map_is_in_fov(fov_map, obj.x, obj.y)]
+    #the map tile under the mouse (the view is mirrored around the player)
+    (x, y) = (player.x - x + VIEW_WIDTH / 2, player.y - y + VIEW_HEIGHT / 2)
+    if not (0 <= x < MAP_WIDTH and 0 <= y < MAP_HEIGHT and fov_map.is_in_fov(x, y)):
+        return ''
+ 
+    #create a list with the names of the corpse and all objects on that tile
+    names = [obj.name for obj in occupancy.objects_at(x, y)]
+    corpse = decals.at(x, y)
+    if corpse is not None:
+        names.insert(0, corpse.name)
  
     names = ', '.join(names)  #join the names, separated by commas
     return names.capitalize()
  
+def compute_fov(x, y, radius, light_walls, algo):
+    #compute the FOV and return it as a boolean array the size of the map
+    return fov_map.compute(x, y, radius, light_walls, algo)
+ 
+def init_fov():
+    global fov_map
+    #create the FOV map, according to the generated map. it reads the map's
+    #arrays directly, so there's no per-tile setup
+    fov_map = fov.FovMap(map)
+    fov_cache.transparency_changed()
+ 
+def update_fov():
+    #get the FOV. it's only recomputed if the player moved or the terrain changed
+    return fov_cache.compute(player.x, player.y, TORCH_RADIUS, FOV_LIGHT_WALLS, FOV_ALGO, map.revision)
+
+flow_field = None
+flow_key = None
+
+def player_flow():
+    #the distances to the player that chasing monsters follow. it's worked out
+    #once for everyone, and again only when the player moves or the map changes
+    global flow_field, flow_key
+    key = (map, map.revision, player.x, player.y)
+    if key != flow_key:
+        flow_field = pathing.FlowField(map.blocked, player.x, player.y, FLOW_RADIUS)
+        flow_key = key
+    return flow_field
+ 
 def render_all():
     global fov_map, color_dark_wall, color_light_wall
     global color_dark_ground, color_light_ground
-    global fov_recompute
  
-    #go through and clear view for every square to prevent artifacts - messy programming but i don't care!         
-    for y in range(VIEW_HEIGHT):
-        for x in range(VIEW_WIDTH):
-            libtcod.console_put_char_ex(con, x, y, ' ', libtcod.black, libtcod.black)
+    #the game rules need the FOV even when there's no window to draw in
+    visible = update_fov()
+    if HEADLESS:
+        return
+ 
+    #start drawing a new frame of the view
+    frame.clear()
     
-    if fov_recompute:
-        #recompute FOV if needed (the player moved or something)
-        fov_recompute = True #originally set to false but changed because fov needs to be recomputed every turn for neatness!
-        libtcod.map_compute_fov(fov_map, player.x, player.y, TORCH_RADIUS, FOV_LIGHT_WALLS, FOV_ALGO)
-
-#go through all tiles, and set their background color according to the FOV
-        for y in range(MAP_HEIGHT):
-            for x in range(MAP_WIDTH):
-                vx = player.x - x + (VIEW_WIDTH / 2)
-                vy = player.y - y + (VIEW_HEIGHT / 2)
-                visible = libtcod.map_is_in_fov(fov_map, x, y)
-                wall = map[x][y].block_sight
-                if vx in range(0, VIEW_WIDTH) and vy in range(0, VIEW_HEIGHT): 
-                    if not visible:
-                        #if it's not visible right now, the player can only see it if it's explored
-                        if map[x][y].explored:
-                            if wall:
-                                libtcod.console_set_back(con, vx, vy, color_dark_wall, libtcod.BKGND_SET)
-                            else:
-                                libtcod.console_set_back(con, vx, vy, color_dark_ground, libtcod.BKGND_SET)
-                    else:
-                        #it's visible
-                        if wall:
-                            libtcod.console_set_back(con, vx, vy, color_light_wall, libtcod.BKGND_SET )
-                        else:
-                            libtcod.console_set_back(con, vx, vy, color_light_ground, libtcod.BKGND_SET )
-                        #since it's visible, explore it
-                        map[x][y].explored = True
+    #set the background color of every tile in view according to the FOV, in one go
+    window = render.view_window(player.x, player.y, VIEW_WIDTH, VIEW_HEIGHT, MAP_WIDTH, MAP_HEIGHT)
+    frame.bg[:] = render.background(map, visible, window, color_dark_wall, color_light_wall,
+        color_dark_ground, color_light_ground)
                     
-    #draw all objects in the list, except the player. we want it to
-    #always appear over all other objects! so it's drawn later.
-    #iterate twice, drawing items first and monsters second so that
-    #monsters always appear on top of items
-    for object in objects:
-        if object != player and object.ai == None:
-            vx = player.x - object.x + (VIEW_WIDTH / 2)
-            vy = player.y - object.y + (VIEW_HEIGHT / 2)
-            if vx in range(0, VIEW_WIDTH) and vy in range(0, VIEW_HEIGHT):
-                object.draw()
-    for object in objects:
-        if object != player and object.ai != None:
-            vx = player.x - object.x + (VIEW_WIDTH / 2)
-            vy = player.y - object.y + (VIEW_HEIGHT / 2)
-            if vx in range(0, VIEW_WIDTH) and vy in range(0, VIEW_HEIGHT):
-                object.draw()            
-    player.draw()
+    #draw the corpses first, then all objects layer by layer: decals, items,
+    #monsters and last the player, so that it always appears over all other objects
+    decals.draw(frame, visible, window)
+    for object in layers.in_draw_order():
+        vx = player.x - object.x + (VIEW_WIDTH / 2)
+        vy = player.y - object.y + (VIEW_HEIGHT / 2)
+        if 0 <= vx < VIEW_WIDTH and 0 <= vy < VIEW_HEIGHT:
+            object.draw()
+ 
+    #push only the cells that changed since the last frame to "con"
+    frame.present(libtcod, con)
  
     #blit the contents of "con" to the root console
     libtcod.console_blit(con, 0, 0, VIEW_WIDTH, VIEW_HEIGHT, 0, 0, 0)
@@ -977,29 +956,23 @@ def message(new_msg, color = libtcod.white):
  
  
 def player_move_or_attack(dx, dy):
-    global fov_recompute
  
     #the coordinates the player is moving to/attacking
     x = player.x + dx
     y = player.y + dy
  
     #try to find an attackable object there
-    target = None
-    for object in objects:
-        if object.fighter and object.x == x and object.y == y:
-            target = object
-            break
+    target = occupancy.fighter_at(x, y)
  
     #attack if target found, move otherwise
     if target is not None:
         player.fighter.attack(target)
     else:
         player.move(dx, dy)
-        fov_recompute = True
 
 def player_rest():
-    global fov_recompute
-    fov_recompute = True
+    #pass a turn without doing anything
+    pass
         
  
 def menu(header, options, width):
@@ -1147,8 +1120,8 @@ def handle_keys():
             
         elif key_char == 'g':
             #pick up an item
-            for object in objects:  #look for an item in the player's tile
-                if object.x == player.x and object.y == player.y and object.item:
+            for object in occupancy.objects_at(player.x, player.y):  #look for an item in the player's tile
+                if object.item:
                     object.item.pick_up()
                     break
  
@@ -1210,45 +1183,43 @@ def player_death(player):
     game_state = 'dead'
  
     #for added effect, transform the player into a corpse!
-    player.char = '%'
-    player.color = libtcod.red
- 
-def monster_death(monster):
-    #transform it into a nasty corpse! it doesn't block, can't be
-    #attacked and doesn't move
-    message(monster.name.capitalize() + ' is dead!', libtcod.orange)
-    monster.char = '%'
-    monster.color = libtcod.red
-    monster.blocks = False
+    player.kind = Kind(player.name, '%', libtcod.red)
+ 
+def object_visits():
+    #how many objects the per-frame loops visit now that corpses are decals,
+    #against how many they visited when corpses stayed in "objects": drawing
+    #goes over the objects left, and the names under the mouse only look at
+    #the objects on one tile (at most the fullest one) instead of all of them
+    before = len(objects) + corpses
+    fullest = max([len(cell) for cell in occupancy.cells.values()] or [0])
+    return {'render': (len(objects), before), 'hover': (fullest, before)}
+
+def leave_corpse(monster):
+    #swap the dead monster for a corpse decal on its tile, and take it off the level
+    global corpses
+    decals.put(monster.x, monster.y, monster.kind.corpse)
+    corpses += 1  #even if it covers another corpse, that's one object fewer
     monster.fighter = None
     monster.ai = None
-    monster.name = 'remains of ' + monster.name
-    monster.send_to_back()
+    objects.remove(monster)
+
+def monster_death(monster):
+    #leave a nasty corpse on the floor! it's only a decal, so it
+    #doesn't block, can't be attacked and no longer costs a thing each turn
+    message(monster.name.capitalize() + ' is dead!', libtcod.orange)
+    leave_corpse(monster)
     player.fighter.restore_piety(1)
     
 def leader_death(monster):
-    #transform it into a nasty corpse! it doesn't block, can't be
-    #attacked and doesn't move
+    #leave a nasty corpse on the floor, and whatever it carried
     message(monster.name.capitalize() + ' is dead!', libtcod.pink)
-    monster.char = '%'
-    monster.color = libtcod.red
-    monster.blocks = False
-    monster.fighter = None
-    monster.ai = None
-    monster.name = 'remains of ' + monster.name
-    monster.send_to_back()
+    leave_corpse(monster)
     create_special_item(monster.x, monster.y)
     player.fighter.restore_piety(3)
 
 def victory_death(monster):
     message(monster.name.capitalize() + ' is dead!', libtcod.pink)
-    monster.char = '%'
-    monster.color = libtcod.red
-    monster.blocks = False
-    monster.fighter = None
-    monster.ai = None
-    monster.name = 'remains of ' + monster.name
-    monster.send_to_back()
+    leave_corpse(monster)
     #end the game and print a victory message for the winning player!
     victory_screen()    
     
@@ -1257,19 +1228,47 @@ def create_special_item(x, y):
     while rand in special_items:
         rand = libtcod.random_get_int(0, 0, 3)
     special_items.append(rand)
-    if rand == 0:
-        item_component = Item(use_function=increase_health) 
-        item = Object(x, y, '!', 'scintillating phial', libtcod.green, item=item_component)
-    elif rand == 1:
-        item_component = Item(equip_type='jewellery', evasion=TOTEM_EV)
-        item = Object(x, y, '"', 'grisly totem', libtcod.red, item=item_component)    
-    elif rand == 2:
-        item_component = Item(equip_type='weapon', power=GLOWING_BROAD_SWORD_POWER) 
-        item = Object(x, y, ')', 'glowing broad sword', libtcod.light_violet, item=item_component)    
-    elif rand == 3:
-        item_component = Item(equip_type='armour', defence=MITHRIL_DEFENCE, evasion=MITHRIL_EV) 
-        item = Object(x, y, ']', 'mithril coat', libtcod.cyan, item=item_component)
-    objects.append(item)        
+    objects.append(SPECIAL_ITEMS[rand].spawn(x, y))
+ 
+#############################################
+# Monster templates
+#############################################
+ 
+#each race's kinds, weakest first
+HALFLINGS = [
+    MonsterTemplate('halfling forager', 'h', libtcod.yellow, hp=6, mana=10, piety=10, defence=5, power=5, evasion=15, death_function=monster_death),
+    MonsterTemplate('halfling thug', 'h', libtcod.green, hp=9, mana=10, piety=10, defence=7, power=7, evasion=18, death_function=monster_death),
+    MonsterTemplate('halfling warden', 'h', libtcod.light_blue, hp=12, mana=10, piety=10, defence=9, power=9, evasion=21, death_function=monster_death)]
+GNOMES = [
+    MonsterTemplate('gnome worker', 'g', libtcod.yellow, hp=10, mana=15, piety=15, defence=7, power=7, evasion=10, death_function=monster_death),
+    MonsterTemplate('gnome sapper', 'g', libtcod.green, hp=13, mana=15, piety=15, defence=9, power=9, evasion=12, death_function=monster_death),
+    MonsterTemplate('gnome guard', 'g', libtcod.light_blue, hp=16, mana=15, piety=15, defence=11, power=11, evasion=14, death_function=monster_death)]
+DWARVES = [
+    MonsterTemplate('dwarf miner', 'd', libtcod.yellow, hp=13, mana=5, piety=10, defence=15, power=15, evasion=5, death_function=monster_death),
+    MonsterTemplate('dwarf brute', 'd', libtcod.green, hp=17, mana=5, piety=10, defence=18, power=17, evasion=5, death_function=monster_death),
+    MonsterTemplate('dwarf knight', 'd', libtcod.light_blue, hp=21, mana=5, piety=10, defence=21, power=19, evasion=5, death_function=monster_death)]
+ELVES = [
+    MonsterTemplate('elf scout', 'e', libtcod.yellow, hp=8, mana=15, piety=15, defence=5, power=7, evasion=15, death_function=monster_death),
+    MonsterTemplate('elf hunter', 'e', libtcod.green, hp=11, mana=15, piety=15, defence=7, power=9, evasion=18, death_function=monster_death),
+    MonsterTemplate('elf duellist', 'e', libtcod.light_blue, hp=14, mana=15, piety=15, defence=9, power=11, evasion=21, death_function=monster_death)]
+HUMANS = [
+    MonsterTemplate('human recruit', 'H', libtcod.yellow, hp=12, mana=10, piety=10, defence=10, power=10, evasion=10, death_function=monster_death),
+    MonsterTemplate('human soldier', 'H', libtcod.green, hp=16, mana=10, piety=10, defence=12, power=12, evasion=12, death_function=monster_death),
+    MonsterTemplate('human paladin', 'H', libtcod.light_blue, hp=20, mana=10, piety=10, defence=14, power=14, evasion=14, death_function=monster_death)]
+ 
+#(chance out of 101, lowest strength dice per level, kinds). a race's strength dice
+#goes from level * lowest to level * 4 + 5, see spawn_table()
+MONSTER_RACES = [(20, 1, HALFLINGS), (20, 2, GNOMES), (20, 2, DWARVES), (20, 2, ELVES), (21, 2, HUMANS)]
+MONSTER_TIER_LIMITS = [8, 16] #a strength dice under 8 gives the weakest kind, under 16 the middle one
+spawn_tables = {} #level -> its compiled spawn table
+ 
+#the boss of each level
+LEADERS = {
+    1: MonsterTemplate('halfling elder', 'h', libtcod.red, hp=16, mana=10, piety=10, defence=10, power=10, evasion=25, death_function=leader_death),
+    2: MonsterTemplate('gnome sergeant', 'g', libtcod.red, hp=24, mana=15, piety=15, defence=14, power=14, evasion=10, death_function=leader_death),
+    3: MonsterTemplate('elf captain', 'e', libtcod.red, hp=20, mana=15, piety=15, defence=10, power=10, evasion=30, death_function=leader_death),
+    4: MonsterTemplate('dwarf warleader', 'd', libtcod.red, hp=32, mana=5, piety=10, defence=30, power=30, evasion=5, death_function=leader_death),
+    5: MonsterTemplate('human general', 'H', libtcod.red, hp=28, mana=10, piety=10, defence=20, power=20, evasion=20, death_function=victory_death)}
  
 def target_tile(max_range=None):
     #return the position of a tile left-clicked in player's FOV (optionally in a range), or (None,None) if right-clicked.
@@ -1286,7 +1285,7 @@ def target_tile(max_range=None):
             return (None, None)  #cancel if the player right-clicked or pressed Escape
  
         #accept the target if the player clicked in FOV, and in case a range is specified, if it's in that range
-        if (mouse.lbutton_pressed and libtcod.map_is_in_fov(fov_map, x, y) and
+        if (mouse.lbutton_pressed and 0 <= x < MAP_WIDTH and 0 <= y < MAP_HEIGHT and update_fov()[x, y] and
             (max_range is None or player.distance(x, y) <= max_range)):
             return (x, y)
  
@@ -1298,36 +1297,26 @@ def target_monster(max_range=None):
             return None
  
         #return the first clicked monster, otherwise continue looping
-        for obj in objects:
-            if obj.x == x and obj.y == y and obj.fighter and obj != player:
-                return obj
+        monster = occupancy.fighter_at(x, y, exclude=player)
+        if monster is not None:
+            return monster
  
 def closest_monster(max_range):
-    #find closest enemy, up to a maximum range, and in the player's FOV
-    closest_enemy = None
-    closest_dist = max_range + 1  #start with (slightly more than) maximum range
- 
-    for object in objects:
-        if object.fighter and not object == player and libtcod.map_is_in_fov(fov_map, object.x, object.y):
-            #calculate distance between this object and the player
-            dist = player.distance_to(object)
-            if dist < closest_dist:  #it's closer, so remember it
-                closest_enemy = object
-                closest_dist = dist
-    return closest_enemy
+    #find closest enemy, up to a maximum range (or slightly more), and in the player's FOV
+    closest = fighters.nearest(player.x, player.y, 1, max_range + 1, update_fov(), exclude=player)
+    if closest:
+        return closest[0]
+    return None
  
 def ray_effect(x1, y1, x2, y2, color):
+    if HEADLESS: return  #no animations without a window
     #shows a ray animation as a fuzzy line between 2 tiles.
     render_all()  #first, re-render the screen (erase inventory, etc)
     libtcod.console_set_foreground_color(0, color)
 
     for frame in range(ANIMATION_FRAMES):
-        #for each frame of the animation, start a line between the tiles
-        libtcod.line_init(x1, y1, x2, y2)
-        while True:  #step through all tiles in the line
-            (x, y) = libtcod.line_step()
-            if x is None: break
-            
+        #for each frame of the animation, step through all tiles in the line
+        for (x, y) in bresenham.line(x1, y1, x2, y2):
             #draw a tile as a random character made of little squares
             char = libtcod.random_get_int(0, libtcod.CHAR_SUBP_NW, libtcod.CHAR_SUBP_SW)
             libtcod.console_put_char(0, player.x - x + VIEW_WIDTH / 2, player.y - y + VIEW_HEIGHT / 2, char, libtcod.BKGND_NONE)
@@ -1335,64 +1324,29 @@ def ray_effect(x1, y1, x2, y2, color):
         libtcod.console_check_for_keypress()
         libtcod.console_flush()  #show result
 
-def explosion_effect(cx, cy, radius, inner_color, outer_color):
+def area_effect(blasts):
+    #animate any number of blasts (see effects.Blast) together
+    if HEADLESS: return  #no animations without a window
     render_all()  #first, re-render the screen
-    num_frames = float(ANIMATION_FRAMES)  #number of frames as a float, so dividing an int by it doesn't yield an int
 
-    for frame in range(ANIMATION_FRAMES):
-        #loop through all tiles in a square around the center. min and max make sure it doesn't go out of the map.
-        for x in range(0, MAP_WIDTH):
-            for y in range(0, MAP_HEIGHT):
-                #only draw on visible floor tile
-                if not map[x][y].blocked and libtcod.map_is_in_fov(fov_map, x, y):
-                    #interpolate between inner and outer color
-                    r = 0.5 * radius * frame/num_frames  #the radius expands as the animation advances
-                    sqr_dist = (x - cx) ** 2 + (y - cy) ** 2  #the squared distance from tile to center
-                    #alpha increases with radius (0.9*r) and decreases with distance to center. the +0.1 prevents a division by 0 at the center.
-                    alpha = (0.9*r) ** 2 / (sqr_dist + 0.1)
-                    color = libtcod.color_lerp(outer_color, inner_color, min(1, alpha))  #interpolate colors. also prevent alpha > 1.
-                    
-                    #interpolate between previous color and ground color (fade away from the center)
-                    alpha = r ** 2 / (sqr_dist + 0.1)  #same as before, but with the full radius (r) instead of (0.9*r)
-                    alpha = min(alpha, 4*(1 - frame/num_frames))  #impose on alpha an upper limit that decreases as the animation advances, so it fades out in the end
-                    color = libtcod.color_lerp(color_light_ground, color, min(1, alpha))  #same as before
-                    libtcod.console_set_back(con, player.x - x + VIEW_WIDTH / 2, player.y - y + VIEW_HEIGHT / 2, color, libtcod.BKGND_SET)  #set the tile color
-                    libtcod.console_blit(con, 0, 0, VIEW_WIDTH, VIEW_HEIGHT, 0, 0, 0)
-        libtcod.console_check_for_keypress()
-        libtcod.console_flush()  #show result
-    render_all()
-
-def double_explosion_effect(cx1, cy1, cx2, cy2, radius, inner_color, outer_color):
-    render_all()  #first, re-render the screen
-    num_frames = float(ANIMATION_FRAMES)  #number of frames as a float, so dividing an int by it doesn't yield an int
+    #only draw on the visible floor tiles in view. their distances to each center are worked out once
+    window = render.view_window(player.x, player.y, VIEW_WIDTH, VIEW_HEIGHT, MAP_WIDTH, MAP_HEIGHT)
+    floor = effects.visible_floor(map, fov_map.visible, window)
+    sqr_dists = [effects.sqr_distances(window, blast.x, blast.y)[floor] for blast in blasts]
 
-    for frame in range(ANIMATION_FRAMES):
-        #loop through all tiles in a square around the center. min and max make sure it doesn't go out of the map.
-        for x in range(0, MAP_WIDTH):
-            for y in range(0, MAP_HEIGHT):
-                #only draw on visible floor tile
-                if not map[x][y].blocked and libtcod.map_is_in_fov(fov_map, x, y):
-                    #interpolate between inner and outer color
-                    r = 0.5 * radius * frame/num_frames  #the radius expands as the animation advances
-                    sqr_dist1 = (x - cx1) ** 2 + (y - cy1) ** 2  #the squared distance from tile to center
-                    sqr_dist2 = (x - cx2) ** 2 + (y - cy2) ** 2  #the squared distance from tile to center
-                    #alpha increases with radius (0.9*r) and decreases with distance to center. the +0.1 prevents a division by 0 at the center.
-                    alpha1 = (0.9*r) ** 2 / (sqr_dist1 + 0.1)
-                    alpha2 = (0.9*r) ** 2 / (sqr_dist2 + 0.1)
-                    color1 = libtcod.color_lerp(outer_color, inner_color, min(1, alpha1))  #interpolate colors. also prevent alpha > 1.
-                    color2 = libtcod.color_lerp(outer_color, inner_color, min(1, alpha2))  #interpolate colors. also prevent alpha > 1.
-                    #interpolate between previous color and ground color (fade away from the center)
-                    alpha1 = r ** 2 / (sqr_dist1 + 0.1)  #same as before, but with the full radius (r) instead of (0.9*r)
-                    alpha2 = r ** 2 / (sqr_dist2 + 0.1)  #same as before, but with the full radius (r) instead of (0.9*r)
-                    alpha1 = min(alpha1, 4*(1 - frame/num_frames))  #impose on alpha an upper limit that decreases as the animation advances, so it fades out in the end
-                    alpha2 = min(alpha2, 4*(1 - frame/num_frames))  #impose on alpha an upper limit that decreases as the animation advances, so it fades out in the end
-                    color1 = libtcod.color_lerp(color_light_ground, color1, min(1, alpha1))  #same as before
-                    color2 = libtcod.color_lerp(color_light_ground, color2, min(1, alpha2))  #same as before
-                    libtcod.console_set_back(con, player.x - x + VIEW_WIDTH / 2, player.y - y + VIEW_HEIGHT / 2, color1 + color2, libtcod.BKGND_SET)  #set the tile color
-                    libtcod.console_blit(con, 0, 0, VIEW_WIDTH, VIEW_HEIGHT, 0, 0, 0)
+    for frame_number in range(ANIMATION_FRAMES):
+        #color the whole view in one go, then show it
+        colors = frame.bg.copy()
+        colors[floor] = effects.composite_colors(blasts, sqr_dists, frame_number, ANIMATION_FRAMES, color_light_ground)
+        libtcod.console_fill_background(con, colors[:, :, 0].ravel(), colors[:, :, 1].ravel(), colors[:, :, 2].ravel())
+        libtcod.console_blit(con, 0, 0, VIEW_WIDTH, VIEW_HEIGHT, 0, 0, 0)
         libtcod.console_check_for_keypress()
         libtcod.console_flush()  #show result
+    frame.invalidate()  #the effect drew straight on "con"
     render_all()
+
+def explosion_effect(cx, cy, radius, inner_color, outer_color):
+    area_effect([effects.Blast(cx, cy, radius, inner_color, outer_color)])
     
     
 def cast_heal():
@@ -1463,7 +1417,8 @@ def cast_blink():
         message('Left-click the target location, or right-click to cancel.', libtcod.light_blue)
         (x, y) = target_tile()
         if not is_blocked(x, y):
-            double_explosion_effect(player.x, player.y, x, y, 3, libtcod.light_blue, libtcod.light_pink)
+            area_effect([effects.Blast(player.x, player.y, 3, libtcod.light_blue, libtcod.light_pink),
+                effects.Blast(x, y, 3, libtcod.light_blue, libtcod.light_pink)])
             player.x = x
             player.y = y
         else:
@@ -1484,8 +1439,9 @@ def cast_fireball():
         #show an explosion
         explosion_effect(x, y, FIREBALL_RADIUS + 1, libtcod.white, libtcod.orange)
  
-        for obj in objects:  #damage every fighter in range, including the player
-            if obj.distance(x, y) <= FIREBALL_RADIUS and obj.fighter:
+        #damage every fighter in range, including the player, nearest first
+        for obj in fighters.nearest(x, y, len(fighters), FIREBALL_RADIUS + 1):
+            if obj.distance(x, y) <= FIREBALL_RADIUS:
                 message('The ' + obj.name + ' gets burned for ' + str(FIREBALL_DAMAGE) + ' hit points.', libtcod.orange)
                 obj.fighter.take_damage(FIREBALL_DAMAGE)
     else:
@@ -1504,8 +1460,9 @@ def cast_acid_arrow():
         #show an explosion
         explosion_effect(x, y, ACID_ARROW_RADIUS + 1, libtcod.dark_chartreuse, libtcod.light_chartreuse)
  
-        for obj in objects:  #damage every fighter in range, including the player
-            if obj.distance(x, y) <= ACID_ARROW_RADIUS and obj.fighter:
+        #damage every fighter in range, including the player, nearest first
+        for obj in fighters.nearest(x, y, len(fighters), ACID_ARROW_RADIUS + 1):
+            if obj.distance(x, y) <= ACID_ARROW_RADIUS:
                 message('The ' + obj.name + ' gets scalded for ' + str(ACID_ARROW_DAMAGE) + ' hit points.', libtcod.light_chartreuse)
                 obj.fighter.take_damage(ACID_ARROW_DAMAGE)
     else:
@@ -1538,6 +1495,40 @@ def increase_health():
     message('The liquid heals and invigorates you!', libtcod.yellow)
     explosion_effect(player.x, player.y, 10, libtcod.light_red, libtcod.yellow)  #show effect
 
+#############################################
+# Item templates
+#############################################
+ 
+#the items found in rooms, with their chance out of 101. it's the same on every
+#level for now, but loot_table() compiles a table per level
+ITEMS = [
+    (ItemTemplate('healing potion', '!', libtcod.yellow, use_function=cast_heal), 30),
+    (ItemTemplate('mana potion', '!', libtcod.light_violet, use_function=cast_restore_mana), 20),
+    (ItemTemplate('scroll of lightning bolt', '?', libtcod.white, use_function=cast_lightning), 5),
+    (ItemTemplate('scroll of fireball', '?', libtcod.red, use_function=cast_fireball), 5),
+    (ItemTemplate('scroll of confusion', '?', libtcod.green, use_function=cast_confuse), 5),
+    (ItemTemplate('scroll of acid arrow', '?', libtcod.light_chartreuse, use_function=cast_acid_arrow), 5),
+    (ItemTemplate('scroll of magic missle', '?', libtcod.light_magenta, use_function=cast_magic_missle), 5),
+    (ItemTemplate('scroll of blink', '?', libtcod.cyan, use_function=cast_blink), 5),
+    (ItemTemplate('club', ')', libtcod.light_orange, equip_type='weapon', power=CLUB_POWER), 2),
+    (ItemTemplate('dagger', ')', libtcod.light_sky, equip_type='weapon', power=DAGGER_POWER), 2),
+    (ItemTemplate('short sword', ')', libtcod.sky, equip_type='weapon', power=SHORT_SWORD_POWER), 2),
+    (ItemTemplate('mace', ')', libtcod.light_blue, equip_type='weapon', power=MACE_POWER), 2),
+    (ItemTemplate('axe', ')', libtcod.cyan, equip_type='weapon', power=AXE_POWER), 2),
+    (ItemTemplate('filthy tunic', ']', libtcod.light_red, equip_type='armour', defence=RAGS_DEFENCE, evasion=RAGS_EV), 2),
+    (ItemTemplate('leather armour', ']', libtcod.orange, equip_type='armour', defence=LEATHER_DEFENCE, evasion=LEATHER_EV), 2),
+    (ItemTemplate('ring mail armour', ']', libtcod.light_blue, equip_type='armour', defence=RING_MAIL_DEFENCE, evasion=RING_MAIL_EV), 2),
+    (ItemTemplate('chain mail armour', ']', libtcod.sky, equip_type='armour', defence=CHAIN_MAIL_DEFENCE, evasion=CHAIN_MAIL_EV), 2),
+    (ItemTemplate('plate mail armour', ']', libtcod.blue, equip_type='armour', defence=PLATE_MAIL_DEFENCE, evasion=PLATE_MAIL_EV), 3)]
+loot_tables = {} #level -> its compiled loot table
+ 
+#the unique items dropped by the level bosses
+SPECIAL_ITEMS = [
+    ItemTemplate('scintillating phial', '!', libtcod.green, use_function=increase_health),
+    ItemTemplate('grisly totem', '"', libtcod.red, equip_type='jewellery', evasion=TOTEM_EV),
+    ItemTemplate('glowing broad sword', ')', libtcod.light_violet, equip_type='weapon', power=GLOWING_BROAD_SWORD_POWER),
+    ItemTemplate('mithril coat', ']', libtcod.cyan, equip_type='armour', defence=MITHRIL_DEFENCE, evasion=MITHRIL_EV)]
+ 
 def pray():
     if player.name == 'orc':
         message('You call upon Gruumsh for help!', libtcod.yellow)
@@ -1556,15 +1547,13 @@ def orc_prayer():
         message('You feel the effects of an ancient curse!', libtcod.red)
         curse(player)
         explosion_effect(player.x, player.y, 20, libtcod.black, libtcod.violet)
-    elif player.fighter.status_effect == 'war_lust':
+    elif player.fighter.has_status('war_lust'):
         message('Gruumsh is already aiding you!', libtcod.yellow)
     else:
         player.fighter.use_piety(5)
         message('Gruumsh is pleased by your ongoing worship!', libtcod.yellow)
         message('You become enraged and consumed with warlust!', libtcod.red)
-        player.fighter.status_effect = 'war_lust'
-        player.fighter.timer = libtcod.random_get_int(0, 10, 15)
-        calc_stats()
+        add_status(player.fighter, 'war_lust', libtcod.random_get_int(0, 10, 15))
         explosion_effect(player.x, player.y, 20, libtcod.dark_red, libtcod.red)
 
 def kobold_prayer():
@@ -1574,14 +1563,13 @@ def kobold_prayer():
         message('You feel the effects of an ancient curse!', libtcod.red)
         curse(player)
         explosion_effect(player.x, player.y, 20, libtcod.black, libtcod.violet)        
-    elif player.fighter.status_effect == 'invisible':
+    elif player.fighter.has_status('invisible'):
         message('Gaknulak is already aiding you!', libtcod.yellow)
     else:
         player.fighter.use_piety(5)
         message('Gaknulak is pleased by your ongoing worship!', libtcod.yellow)
         message('You slip into the shadows to avoid detection!', libtcod.grey)
-        player.fighter.status_effect = 'invisible'
-        player.fighter.timer = libtcod.random_get_int(0, 10, 15)
+        add_status(player.fighter, 'invisible', libtcod.random_get_int(0, 10, 15))
         explosion_effect(player.x, player.y, 20, libtcod.black, libtcod.grey)        
         
 def goblin_prayer():
@@ -1594,35 +1582,29 @@ def goblin_prayer():
     else:
         player.fighter.use_piety(5)
         message('Maglubiyet is pleased by your ongoing worship!', libtcod.yellow)
+        blasts = []
         for object in objects: #curse them all!
             if object.ai != None and object != player:
-                 if libtcod.map_is_in_fov(fov_map, object.x, object.y):
+                 if fov_map.is_in_fov(object.x, object.y):
                      curse(object)
                      message(object.name.capitalize() + ' is cursed by Maglubiyet!', libtcod.light_violet)
-                     explosion_effect(object.x, object.y, 2, libtcod.black, libtcod.light_violet)
+                     blasts.append(effects.Blast(object.x, object.y, 2, libtcod.black, libtcod.light_violet))
+        if blasts:
+            area_effect(blasts)  #one animation for all of them
         
 def curse(monster):
     if monster == player:
-        player.fighter.status_effect = 'cursed'
-        player.fighter.timer = libtcod.random_get_int(0, 10, 30)
-        calc_stats()
+        add_status(player.fighter, 'cursed', libtcod.random_get_int(0, 10, 30))
     else:
-        if monster.fighter.max_power >= abs(CURSE_POWER_EFFECT): monster.fighter.power = monster.fighter.max_power + CURSE_POWER_EFFECT
-        else: monster.fighter.power = 0
-        if monster.fighter.max_defence >= abs(CURSE_DEFENCE_EFFECT): monster.fighter.defence = monster.fighter.max_defence + CURSE_DEFENCE_EFFECT
-        else: monster.fighter.defence = 0
-        if monster.fighter.max_evasion >= abs(CURSE_EV_EFFECT): monster.fighter.evasion = monster.fighter.max_evasion + CURSE_EV_EFFECT
-        else: monster.fighter.evasion = 0
+        add_status(monster.fighter, 'cursed')  #monsters stay cursed for good
         
-def prayer_cancel():        
-    if player.fighter.status_effect == 'cursed': message('The effect of the curse expires.', libtcod.yellow)
+def prayer_cancel(effect):        
+    if effect == 'cursed': message('The effect of the curse expires.', libtcod.yellow)
     else: message('The effect of your prayer expires.', libtcod.yellow)
-    player.fighter.status_effect = None
-    calc_stats()
+    end_status(player.fighter, effect)
         
 def player_orc():
-    player.name = 'orc'
-    player.color = libtcod.light_chartreuse
+    player.kind = Kind('orc', '@', libtcod.light_chartreuse)
     player.fighter.hp = 40
     player.fighter.max_hp = 40
     player.fighter.mana = 5
@@ -1637,8 +1619,7 @@ def player_orc():
     player.fighter.max_evasion = 5
    
 def player_kobold():
-    player.name = 'kobold'
-    player.color = libtcod.light_red
+    player.kind = Kind('kobold', '@', libtcod.light_red)
     player.fighter.hp = 20
     player.fighter.max_hp = 20
     player.fighter.mana = 15
@@ -1654,8 +1635,7 @@ def player_kobold():
     
 
 def player_goblin():
-    player.name = 'goblin'
-    player.color = libtcod.light_sea
+    player.kind = Kind('goblin', '@', libtcod.light_sea)
     player.fighter.hp = 25
     player.fighter.max_hp = 25
     player.fighter.mana = 30
@@ -1672,16 +1652,11 @@ def player_goblin():
 def generate_new_level():
     global fov_map, objects, level
     level = level + 1
-    for object in objects:
+    for object in list(objects):  #a copy, as removing while iterating would skip every other object
         objects.remove(object)
-    objects = [player]
-    libtcod.map_delete(fov_map)
-    fov_map = libtcod.map_new(MAP_WIDTH, MAP_HEIGHT)
+    new_level_objects()
     make_map()
-    for y in range(MAP_HEIGHT):
-        for x in range(MAP_WIDTH):
-            libtcod.map_set_properties(fov_map, x, y, not map[x][y].blocked, not map[x][y].block_sight) 
-    fov_recompute = True
+    init_fov()
     libtcod.console_flush()
     render_all()
 
@@ -1756,83 +1731,120 @@ def victory_screen():
 # Initialization & Main Loop
 #############################################
  
-libtcod.console_set_custom_font('terminal10x10_gs_tc.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
-libtcod.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, 'Defender of the Deep', False)
-libtcod.sys_set_fps(LIMIT_FPS)
-con = libtcod.console_new(VIEW_WIDTH, VIEW_HEIGHT)
-panel = libtcod.console_new(SCREEN_WIDTH, PANEL_HEIGHT)
+def init_console():
+    global con, panel, frame
+    libtcod.console_set_custom_font('terminal10x10_gs_tc.png', libtcod.FONT_TYPE_GREYSCALE | libtcod.FONT_LAYOUT_TCOD)
+    libtcod.console_init_root(SCREEN_WIDTH, SCREEN_HEIGHT, 'Defender of the Deep', False)
+    libtcod.sys_set_fps(LIMIT_FPS)
+    con = libtcod.console_new(VIEW_WIDTH, VIEW_HEIGHT)
+    panel = libtcod.console_new(SCREEN_WIDTH, PANEL_HEIGHT)
+    frame = render.FrameBuffer(VIEW_WIDTH, VIEW_HEIGHT)
+ 
+def new_game(race_choice):
+    global player, inventory, weapon, armour, jewellery, special_items, level
+    global fov_cache, game_state, player_action, game_msgs
+ 
+    #create object representing the player
+    fighter_component = Fighter(hp=30, mana = 20, piety = 20, defence=10, power=10, evasion =10, death_function=player_death)
+    player = Object(0, 0, Kind('player', '@', libtcod.white), blocks=True, fighter=fighter_component, layer=render.PLAYER)
 
-starting_text()
-race_choice = starting_menu()
+    if race_choice == 0:
+        player_orc()
+    elif race_choice == 1:
+        player_kobold()
+    elif race_choice == 2:
+        player_goblin()
+ 
+    #the lists and other variables where we will store player, inventory and other objects
+    new_level_objects()
+    inventory = []
+    weapon = None
+    armour = None
+    jewellery = None
+    special_items = [] #to be used to store unique special items when they are generated 
+ 
+    #generate map (at this point it's not drawn to the screen)
+    level = 1
+    make_map()
  
-#create object representing the player
-fighter_component = Fighter(hp=30, mana = 20, piety = 20, defence=10, power=10, evasion =10, death_function=player_death)
-player = Object(0, 0, '@', 'player', libtcod.white, blocks=True, fighter=fighter_component)
-
-if race_choice == 0:
-    player_orc()
-elif race_choice == 1:
-    player_kobold()
-elif race_choice == 2:
-    player_goblin()
- 
-#the lists and other variables where we will store player, inventory and other objects
-objects = [player]
-inventory = []
-weapon = None
-armour = None
-jewellery = None
-special_items = [] #to be used to store unique special items when they are generated 
- 
-#generate map (at this point it's not drawn to the screen)
-level = 1
-make_map()
- 
-#create the FOV map, according to the generated map
-fov_map = libtcod.map_new(MAP_WIDTH, MAP_HEIGHT)
-for y in range(MAP_HEIGHT):
-    for x in range(MAP_WIDTH):
-        libtcod.map_set_properties(fov_map, x, y, not map[x][y].blocked, not map[x][y].block_sight) 
- 
-fov_recompute = True
-game_state = 'playing'
-player_action = None
- 
-#create the list of game messages and their colors, starts empty
-game_msgs = []
- 
-#a warm welcoming message!
-message('The time for vengeance is at hand! Butcher the invaders!', libtcod.red)
-message('(If this is your first time, press "?" for instructions.)', libtcod.white)
- 
-while not libtcod.console_is_window_closed():
- 
-    #render the screen
-    render_all()
+    #create the FOV map, according to the generated map. the cache skips
+    #recomputing it while neither the player nor the terrain changed
+    fov_cache = fov.FovCache(compute_fov)
+    init_fov()
  
-    libtcod.console_flush()
+    game_state = 'playing'
+    player_action = None
  
-    #erase all objects at their old locations, before they move
-    for object in objects:
-        vx = player.x - object.x + (VIEW_WIDTH / 2)
-        vy = player.y - object.y + (VIEW_HEIGHT / 2)
-        if vx in range(0, VIEW_WIDTH) and vy in range(0, VIEW_HEIGHT):
-            object.clear()
+    #create the list of game messages and their colors, starts empty
+    game_msgs = []
+ 
+    #a warm welcoming message!
+    message('The time for vengeance is at hand! Butcher the invaders!', libtcod.red)
+    message('(If this is your first time, press "?" for instructions.)', libtcod.white)
+ 
+def play_game(max_turns=None):
+    #the main loop. returns the number of turns the player took
+    global player_action
+    turns = 0
+    while not libtcod.console_is_window_closed():
+ 
+        #render the screen
+        render_all()
  
-    #handle keys and exit game if needed
-    player_action = handle_keys()
-    if player_action == 'exit':
-        break
+        libtcod.console_flush()
+ 
+        #handle keys and exit game if needed
+        player_action = handle_keys()
+        if player_action == 'exit':
+            break
     
-    #handle player status effects
-    if game_state == 'playing' and player_action != 'didnt-take-turn':
-        if player.fighter.timer > 0:
-            player.fighter.timer = player.fighter.timer - 1
-            if player.fighter.timer == 0:
-                prayer_cancel()
- 
-    #let monsters take their turn
-    if game_state == 'playing' and player_action != 'didnt-take-turn':
-        for object in objects:
-            if object.ai:
-                object.ai.take_turn()
\ No newline at end of file
+        #handle status effects, counting down all timers at once
+        if game_state == 'playing' and player_action != 'didnt-take-turn':
+            for (fighter, effect) in fighter_stats.tick_timers():
+                if fighter is player.fighter:
+                    prayer_cancel(effect)
+                else:
+                    end_status(fighter, effect)
+ 
+        #let monsters take their turn
+        if game_state == 'playing' and player_action != 'didnt-take-turn':
+            scheduler.advance()
+ 
+        if player_action != 'didnt-take-turn':
+            turns += 1
+        if max_turns is not None and turns >= max_turns:
+            break
+        if HEADLESS and game_state != 'playing':
+            break  #nobody is watching, so stop once the game is over
+    return turns
+ 
+def run_headless(commands, race_choice=0, max_turns=None, seed=None):
+    #run the game rules with no window: map generation, monsters, combat, items
+    #and prayers all work as usual, but input comes from the "commands" script
+    #(see headless.set_input), nothing is drawn and there is no frame cap.
+    #returns a summary of the run.
+    if not HEADLESS:
+        raise RuntimeError('run_headless needs dotd to be loaded with DOTD_HEADLESS=1 or --headless')
+    if seed is not None:
+        libtcod.random_seed(seed)
+    libtcod.set_input(commands)
+    init_console()
+    new_game(race_choice)
+    turns = play_game(max_turns)
+    return {'turns': turns, 'game_state': game_state, 'level': level, 'hp': player.fighter.hp,
+        'objects': len(objects), 'corpses': corpses, 'object_visits': object_visits(),
+        'fov_hits': fov_cache.hits, 'fov_misses': fov_cache.misses}
+ 
+ 
+if __name__ == '__main__':
+    if HEADLESS:
+        #python dotd.py --headless [turns] [seed]: simulate a game with random input
+        args = [int(arg) for arg in sys.argv[1:] if arg != '--headless']
+        turns = args[0] if len(args) > 0 else 1000
+        seed = args[1] if len(args) > 1 else None
+        print(run_headless(libtcod.random_commands(seed), max_turns=turns, seed=seed))
+    else:
+        init_console()
+        starting_text()
+        new_game(starting_menu())
+        play_game()
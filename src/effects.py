@@ -0,0 +1,62 @@
+import numpy
+
+#spell animations, computed for the whole view at once with numpy.
+
+
+def visible_floor(tilemap, visible, window):
+    #boolean [vy, vx] mask of the view's cells showing a visible floor tile,
+    #the only tiles the effects are drawn on
+    (xs, ys, x_in, y_in) = window
+    inside = y_in[:, None] & x_in[None, :]
+    floor = ~tilemap.blocked[xs[None, :], ys[:, None]]
+    return inside & floor & visible[xs[None, :], ys[:, None]]
+
+
+def sqr_distances(window, cx, cy):
+    #squared distance from every cell of the view to the map tile (cx, cy)
+    (xs, ys, x_in, y_in) = window
+    return ((xs[None, :] - cx) ** 2 + (ys[:, None] - cy) ** 2).astype(numpy.float64)
+
+
+def lerp(c1, c2, alpha):
+    #interpolate between two colors (or arrays of colors), like libtcod.color_lerp
+    c1 = numpy.asarray(c1, dtype=numpy.float64)
+    c2 = numpy.asarray(c2, dtype=numpy.float64)
+    return (c1 + (c2 - c1) * alpha[..., None]).astype(numpy.uint8)
+
+
+def explosion_colors(sqr_dist, frame, num_frames, radius, inner_color, outer_color, ground_color):
+    #the colors of an explosion "frame" frames in, for the given squared distances to its center
+    r = 0.5 * radius * frame / float(num_frames)  #the radius expands as the animation advances
+    #interpolate between inner and outer color. alpha increases with radius (0.9*r) and
+    #decreases with distance to center. the +0.1 prevents a division by 0 at the center.
+    alpha = numpy.minimum(1, (0.9 * r) ** 2 / (sqr_dist + 0.1))
+    color = lerp(list(outer_color), list(inner_color), alpha)
+
+    #interpolate between that color and ground color (fade away from the center), with
+    #an upper limit that decreases as the animation advances, so it fades out in the end
+    alpha = numpy.minimum(r ** 2 / (sqr_dist + 0.1), 4 * (1 - frame / float(num_frames)))
+    return lerp(list(ground_color), color, numpy.minimum(1, alpha))
+
+
+class Blast(object):
+    #one source of an area effect: a burst of color spreading from a map tile
+    def __init__(self, x, y, radius, inner_color, outer_color):
+        self.x = x
+        self.y = y
+        self.radius = radius
+        self.inner_color = inner_color
+        self.outer_color = outer_color
+
+
+def composite_colors(blasts, sqr_dists, frame, num_frames, ground_color):
+    #the colors of several blasts at once, "frame" frames in. sqr_dists holds the
+    #squared distances to each blast's center. each blast adds how far it pulls a
+    #tile away from the ground color, so a lone blast looks just like an explosion
+    #and overlapping ones brighten each other.
+    ground = numpy.array(list(ground_color), dtype=numpy.int32)
+    total = numpy.zeros(sqr_dists[0].shape + (3,), dtype=numpy.int32) + ground
+    for (blast, sqr_dist) in zip(blasts, sqr_dists):
+        colors = explosion_colors(sqr_dist, frame, num_frames, blast.radius, blast.inner_color, blast.outer_color, ground_color)
+        total += colors.astype(numpy.int32) - ground
+    return numpy.clip(total, 0, 255).astype(numpy.uint8)
@@ -0,0 +1,327 @@
+import math
+from fractions import Fraction
+import numpy
+
+#field of view, computed in python/numpy straight from the tile map's arrays,
+#so it works without the libtcod library. it also has a cache that skips
+#recomputing the FOV when nothing it depends on changed.
+
+#algorithm numbers, the same as libtcod's
+FOV_BASIC = 0
+FOV_DIAMOND = 1
+FOV_SHADOW = 2
+FOV_PERMISSIVE_0 = 3
+FOV_PERMISSIVE_1 = 4
+FOV_PERMISSIVE_2 = 5
+FOV_PERMISSIVE_3 = 6
+FOV_PERMISSIVE_4 = 7
+FOV_PERMISSIVE_5 = 8
+FOV_PERMISSIVE_6 = 9
+FOV_PERMISSIVE_7 = 10
+FOV_PERMISSIVE_8 = 11
+FOV_RESTRICTIVE = 12
+
+
+def FOV_PERMISSIVE(p):
+    return FOV_PERMISSIVE_0 + p
+
+
+def compute_fov(opaque, x, y, radius=0, light_walls=True, algo=FOV_PERMISSIVE_8):
+    #return a boolean array the shape of "opaque" (indexed [x, y]) telling which
+    #tiles can be seen from (x, y). a radius of 0 means no limit.
+    #FOV_BASIC and the permissive algorithms use precomputed rays (fast), every
+    #other algorithm uses recursive shadowcasting.
+    if radius > 0 and algo == FOV_BASIC:
+        return _ray_fov(opaque, x, y, radius, 0, light_walls)
+    if radius > 0 and FOV_PERMISSIVE_0 <= algo <= FOV_PERMISSIVE_8:
+        return _ray_fov(opaque, x, y, radius, algo - FOV_PERMISSIVE_0, light_walls)
+    return shadowcast(opaque, x, y, radius, light_walls)
+
+
+class FovMap(object):
+    #stands in for a libtcod fov map. it reads the transparency straight from
+    #a TileMap, so there is nothing to copy over when the map is made.
+    def __init__(self, tilemap):
+        self.tilemap = tilemap
+        self.visible = numpy.zeros((tilemap.width, tilemap.height), dtype=numpy.bool_)
+
+    def compute(self, x, y, radius=0, light_walls=True, algo=FOV_PERMISSIVE_8):
+        self.visible = compute_fov(self.tilemap.block_sight, x, y, radius, light_walls, algo)
+        return self.visible
+
+    def is_in_fov(self, x, y):
+        #tiles off the map are never in view
+        (width, height) = self.visible.shape
+        return 0 <= x < width and 0 <= y < height and bool(self.visible[x, y])
+
+
+class FovCache(object):
+    #remembers the last field of view that was computed, and only computes it
+    #again when something it depends on changed: the viewer's position, the
+    #radius or algorithm, the terrain (map revision) or the transparency data
+    #the FOV is computed from (transparency revision).
+    def __init__(self, compute):
+        #compute(x, y, radius, light_walls, algo) does the actual work and returns the result
+        self.compute_function = compute
+        self.key = None
+        self.result = None
+        self.transparency_revision = 0
+        self.hits = 0
+        self.misses = 0
+
+    def transparency_changed(self):
+        #call this after changing the transparency data the FOV is computed from
+        self.transparency_revision += 1
+
+    def compute(self, x, y, radius, light_walls, algo, map_revision):
+        key = (x, y, radius, light_walls, algo, map_revision, self.transparency_revision)
+        if key == self.key:
+            self.hits += 1
+        else:
+            self.misses += 1
+            self.result = self.compute_function(x, y, radius, light_walls, algo)
+            self.key = key
+        return self.result
+
+
+#############################################
+# Recursive shadowcasting
+#############################################
+
+#how each of the 8 octants maps (column, row) offsets onto the map
+_OCTANTS = [(1, 0, 0, 1), (0, 1, 1, 0), (0, -1, 1, 0), (-1, 0, 0, 1),
+            (-1, 0, 0, -1), (0, -1, -1, 0), (0, 1, -1, 0), (1, 0, 0, -1)]
+
+
+def shadowcast(opaque, x, y, radius=0, light_walls=True):
+    #recursive shadowcasting: scan each octant row by row moving away from the
+    #viewer, and when a wall is hit, recurse on the part of the row still lit.
+    (width, height) = opaque.shape
+    if radius <= 0:
+        radius = max(width, height)
+    walls = opaque.tolist()  #lists are much quicker to index one tile at a time
+    lit = numpy.zeros(opaque.shape, dtype=numpy.bool_)
+    lit[x, y] = True
+    for (xx, xy, yx, yy) in _OCTANTS:
+        _cast_light(walls, lit, width, height, x, y, 1, 1.0, 0.0, radius, xx, xy, yx, yy, light_walls)
+    return lit
+
+
+def _cast_light(walls, lit, width, height, cx, cy, row, start, end, radius, xx, xy, yx, yy, light_walls):
+    if start < end:
+        return
+    radius_squared = radius * radius
+    new_start = start
+    for j in range(row, radius + 1):
+        dx = -j - 1
+        dy = -j
+        blocked = False
+        while dx <= 0:
+            dx += 1
+            #translate the (dx, dy) octant offsets into map coordinates
+            mx = cx + dx * xx + dy * xy
+            my = cy + dx * yx + dy * yy
+            #slopes of the left and right edges of this tile
+            l_slope = (dx - 0.5) / (dy + 0.5)
+            r_slope = (dx + 0.5) / (dy - 0.5)
+            if start < r_slope:
+                continue
+            elif end > l_slope:
+                break
+
+            inside = 0 <= mx < width and 0 <= my < height
+            wall = not inside or walls[mx][my]
+            if inside and dx * dx + dy * dy <= radius_squared and (light_walls or not wall):
+                lit[mx, my] = True
+
+            if blocked:
+                #we're scanning a row of walls
+                if wall:
+                    new_start = r_slope
+                    continue
+                else:
+                    blocked = False
+                    start = new_start
+                    if start < end:
+                        return  #the walls left no light to go on with
+            elif wall and j < radius:
+                #this is a wall: start a child scan on the part of the row before it
+                blocked = True
+                _cast_light(walls, lit, width, height, cx, cy, j + 1, start, l_slope, radius, xx, xy, yx, yy, light_walls)
+                new_start = r_slope
+        if blocked:
+            break
+
+
+#############################################
+# Precomputed rays (basic and permissive FOV)
+#############################################
+
+#a tile is visible if at least one straight line from a point of the viewer's
+#tile to a point of the target's tile goes through no wall. a line may touch
+#the corners and edges of walls, only their insides block it. the lines are
+#sampled between the tiles' centers and, for the permissive algorithms, their
+#corners: the higher the permissiveness (0 to 8), the nearer to the corners,
+#up to the true corners at 8, so the more lines there are to get through.
+#at 8 the lines shadowcasting sees along are added too, so it sees at least
+#as much as FOV_SHADOW.
+#for each radius and permissiveness, the tiles each line goes through are
+#worked out once and kept as an index array, so computing the FOV is a few
+#numpy gathers over a window around the viewer.
+
+_templates = {}
+
+
+class _RayTemplate(object):
+    def __init__(self, radius, permissiveness):
+        size = 2 * radius + 1
+        offset = 0.5 * permissiveness / 8.0
+        samples = [(0.0, 0.0)]
+        if offset > 0:
+            samples += [(-offset, -offset), (-offset, offset), (offset, -offset), (offset, offset)]
+
+        #the most permissive also sees whatever shadowcasting sees
+        shadow = _shadow_rays(radius) if permissiveness == 8 else {}
+
+        targets = []
+        rays = []
+        starts = []
+        for dx in range(-radius, radius + 1):
+            for dy in range(-radius, radius + 1):
+                if (dx == 0 and dy == 0) or dx * dx + dy * dy > radius * radius:
+                    continue
+                #collect the set of tiles crossed by each line between the two tiles
+                crossed = set()
+                for (ox, oy) in samples:
+                    for (tx, ty) in samples:
+                        cells = _segment_cells(ox, oy, dx + tx, dy + ty)
+                        crossed.add(frozenset(c for c in cells if c != (0, 0) and c != (dx, dy)))
+                crossed.update(shadow.get((dx, dy), ()))
+                #a line that crosses more tiles than another one is never needed:
+                #whenever it's clear, the other one is clear too
+                needed = [c for c in crossed if not any(other < c for other in crossed)]
+                targets.append((dx + radius) * size + (dy + radius))
+                starts.append(len(rays))
+                for c in needed:
+                    rays.append([(cx + radius) * size + (cy + radius) for (cx, cy) in c])
+
+        #pad the rays to the same length with an extra index that's never a wall
+        length = max(1, max(len(r) for r in rays))
+        self.ray_cells = numpy.empty((len(rays), length), dtype=numpy.intp)
+        self.ray_cells.fill(size * size)
+        for (i, r) in enumerate(rays):
+            self.ray_cells[i, :len(r)] = r
+        self.targets = numpy.array(targets, dtype=numpy.intp)
+        self.starts = numpy.array(starts, dtype=numpy.intp)
+        self.size = size
+
+
+def _segment_cells(x0, y0, x1, y1):
+    #return the tiles whose inside the segment from (x0, y0) to (x1, y1) goes
+    #through. tiles are centered on integer coordinates, so their borders are
+    #at half-integers. the segment is cut where it crosses a border, and each
+    #piece lies in one tile (or runs along a border, touching no tile's inside)
+    dx = x1 - x0
+    dy = y1 - y0
+    cuts = set([0.0, 1.0])
+    for (start, d) in ((x0, dx), (y0, dy)):
+        if d != 0:
+            low = int(math.floor(min(start, start + d) - 0.5))
+            high = int(math.ceil(max(start, start + d) + 0.5))
+            for border in range(low, high + 1):
+                t = (border + 0.5 - start) / d
+                if 0.0 < t < 1.0:
+                    cuts.add(t)
+    cuts = sorted(cuts)
+    cells = []
+    for (t0, t1) in zip(cuts, cuts[1:]):
+        mx = x0 + dx * (t0 + t1) / 2
+        my = y0 + dy * (t0 + t1) / 2
+        #a piece running along a border goes between the tiles on both sides
+        xs = [mx - 0.5, mx + 0.5] if dx == 0 and _on_border(mx) else [mx]
+        ys = [my - 0.5, my + 0.5] if dy == 0 and _on_border(my) else [my]
+        for px in xs:
+            for py in ys:
+                cell = (int(math.floor(px + 0.5)), int(math.floor(py + 0.5)))
+                if cell not in cells:
+                    cells.append(cell)
+    return cells
+
+
+def _shadow_rays(radius):
+    #the lines of sight of shadowcast(), as sets of tiles, for each tile in
+    #range. in an octant, tile k of row j spans the slopes from (k - 0.5) / (j + 0.5)
+    #to (k + 0.5) / (j - 0.5) as seen from the viewer's center. light goes
+    #along a slope unless it's strictly inside the span of a wall in a nearer
+    #row, and a tile is lit if light reaches any slope of its span. so the
+    #slopes worth trying for a tile are the ends of the spans in it, and the
+    #slopes halfway between them
+    tiles = [(j, k) for j in range(1, radius + 1) for k in range(j + 1)]
+    spans = [(Fraction(2 * k - 1, 2 * j + 1), Fraction(2 * k + 1, 2 * j - 1)) for (j, k) in tiles]
+    #the ends of the spans as whole numbers, to test every slope against them at once
+    low_num = numpy.array([2 * k - 1 for (j, k) in tiles], dtype=numpy.int64)
+    low_den = numpy.array([2 * j + 1 for (j, k) in tiles], dtype=numpy.int64)
+    high_num = numpy.array([2 * k + 1 for (j, k) in tiles], dtype=numpy.int64)
+    high_den = numpy.array([2 * j - 1 for (j, k) in tiles], dtype=numpy.int64)
+
+    octant_rays = []  #for each tile of an octant, its rays as sets of indexes into tiles
+    nearer = 0  #how many tiles are in the rows before the current one
+    for (i, (j, k)) in enumerate(tiles):
+        if k == 0:
+            nearer = i
+        (low, high) = (max(spans[i][0], 0), min(spans[i][1], 1))
+        ends = set([low, high])
+        for (l, r) in spans[:nearer]:
+            ends.update(e for e in (l, r) if low <= e <= high)
+        ends = sorted(ends)
+        slopes = ends + [(e1 + e2) / 2 for (e1, e2) in zip(ends, ends[1:])]
+        num = numpy.array([slope.numerator for slope in slopes], dtype=numpy.int64)[:, None]
+        den = numpy.array([slope.denominator for slope in slopes], dtype=numpy.int64)[:, None]
+        inside = ((low_num[:nearer] * den < num * low_den[:nearer]) &
+            (num * high_den[:nearer] < high_num[:nearer] * den))
+        octant_rays.append(set(frozenset(numpy.flatnonzero(row).tolist()) for row in inside))
+
+    rays = {}
+    for (xx, xy, yx, yy) in _OCTANTS:
+        #octant offsets (dx, dy) = (-k, -j) turned into map offsets
+        cells = [(-k * xx - j * xy, -k * yx - j * yy) for (j, k) in tiles]
+        for (i, tile_rays) in enumerate(octant_rays):
+            rays.setdefault(cells[i], set()).update(frozenset(cells[c] for c in ray) for ray in tile_rays)
+    return rays
+
+
+def _on_border(v):
+    return abs(v - math.floor(v) - 0.5) < 1e-9
+
+
+def _ray_fov(opaque, x, y, radius, permissiveness, light_walls):
+    key = (radius, permissiveness)
+    template = _templates.get(key)
+    if template is None:
+        template = _templates[key] = _RayTemplate(radius, permissiveness)
+    size = template.size
+
+    #copy the walls around the viewer into a window. tiles off the map are walls
+    (width, height) = opaque.shape
+    x0 = max(0, x - radius)
+    x1 = min(width, x + radius + 1)
+    y0 = max(0, y - radius)
+    y1 = min(height, y + radius + 1)
+    window = numpy.ones((size, size), dtype=numpy.bool_)
+    wx = x0 - (x - radius)
+    wy = y0 - (y - radius)
+    window[wx:wx + x1 - x0, wy:wy + y1 - y0] = opaque[x0:x1, y0:y1]
+    walls = numpy.append(window.ravel(), False)
+
+    #a ray is clear if none of its tiles is a wall, a tile is lit if any of its rays is clear
+    clear = ~walls[template.ray_cells].any(axis=1)
+    lit_window = numpy.zeros(size * size, dtype=numpy.bool_)
+    lit_window[template.targets] = numpy.logical_or.reduceat(clear, template.starts)
+    lit_window = lit_window.reshape((size, size))
+    if not light_walls:
+        lit_window &= ~window
+    lit_window[radius, radius] = True
+
+    lit = numpy.zeros(opaque.shape, dtype=numpy.bool_)
+    lit[x0:x1, y0:y1] = lit_window[wx:wx + x1 - x0, wy:wy + y1 - y0]
+    return lit
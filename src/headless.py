@@ -0,0 +1,262 @@
+import random
+import bresenham
+
+#a stand-in for libtcodpy that needs no window and no libtcod library.
+#it has the colors, constants, random numbers and line drawing the game
+#rules use; every console call does nothing, and key presses and mouse
+#clicks come from a script set with set_input(). used by "dotd.py --headless".
+
+#############################################
+# Colors
+#############################################
+
+class Color(object):
+    def __init__(self, r=0, g=0, b=0):
+        self.r = r
+        self.g = g
+        self.b = b
+
+    def __eq__(self, c):
+        return (self.r, self.g, self.b) == (c.r, c.g, c.b)
+
+    def __ne__(self, c):
+        return not self == c
+
+    def __mul__(self, c):
+        if isinstance(c, Color):
+            return Color(self.r * c.r // 255, self.g * c.g // 255, self.b * c.b // 255)
+        else:
+            return Color(_clamp(self.r * c), _clamp(self.g * c), _clamp(self.b * c))
+
+    def __add__(self, c):
+        return Color(_clamp(self.r + c.r), _clamp(self.g + c.g), _clamp(self.b + c.b))
+
+    def __sub__(self, c):
+        return Color(_clamp(self.r - c.r), _clamp(self.g - c.g), _clamp(self.b - c.b))
+
+    def __repr__(self):
+        return "Color(%d,%d,%d)" % (self.r, self.g, self.b)
+
+    def __iter__(self):
+        yield self.r
+        yield self.g
+        yield self.b
+
+
+def _clamp(v):
+    return int(min(255, max(0, v)))
+
+
+def color_lerp(c1, c2, a):
+    return Color(int(c1.r + (c2.r - c1.r) * a), int(c1.g + (c2.g - c1.g) * a), int(c1.b + (c2.b - c1.b) * a))
+
+black = Color(0, 0, 0)
+darker_grey = Color(63, 63, 63)
+grey = Color(127, 127, 127)
+light_grey = Color(159, 159, 159)
+light_gray = light_grey
+white = Color(255, 255, 255)
+red = Color(255, 0, 0)
+orange = Color(255, 127, 0)
+yellow = Color(255, 255, 0)
+green = Color(0, 255, 0)
+cyan = Color(0, 255, 255)
+sky = Color(0, 191, 255)
+blue = Color(0, 0, 255)
+violet = Color(127, 0, 255)
+magenta = Color(255, 0, 191)
+pink = Color(255, 0, 127)
+dark_red = Color(191, 0, 0)
+dark_chartreuse = Color(95, 191, 0)
+dark_green = Color(0, 191, 0)
+darker_red = Color(127, 0, 0)
+darker_blue = Color(0, 0, 127)
+light_red = Color(255, 114, 114)
+light_orange = Color(255, 184, 114)
+light_chartreuse = Color(184, 255, 114)
+light_green = Color(114, 255, 114)
+light_sea = Color(114, 255, 184)
+light_cyan = Color(114, 255, 255)
+light_sky = Color(114, 219, 255)
+light_blue = Color(114, 114, 255)
+light_violet = Color(184, 114, 255)
+light_magenta = Color(255, 114, 219)
+light_pink = Color(255, 114, 184)
+
+#############################################
+# Constants
+#############################################
+
+BKGND_NONE = 0
+BKGND_SET = 1
+KEY_PRESSED = 1
+KEY_RELEASED = 2
+KEY_NONE = 0
+KEY_ESCAPE = 1
+KEY_ENTER = 4
+KEY_KP1 = 35
+KEY_KP2 = 36
+KEY_KP3 = 37
+KEY_KP4 = 38
+KEY_KP5 = 39
+KEY_KP6 = 40
+KEY_KP7 = 41
+KEY_KP8 = 42
+KEY_KP9 = 43
+KEY_CHAR = 65
+CHAR_SUBP_NW = 226
+CHAR_SUBP_SW = 232
+FONT_TYPE_GREYSCALE = 4
+FONT_LAYOUT_TCOD = 8
+
+#############################################
+# Scripted input
+#############################################
+
+class Key(object):
+    def __init__(self, vk=KEY_NONE, c=0):
+        self.vk = vk
+        self.c = c
+        self.pressed = vk != KEY_NONE
+        self.lalt = False
+        self.lctrl = False
+        self.ralt = False
+        self.rctrl = False
+        self.shift = False
+
+
+class Mouse(object):
+    def __init__(self, cx=0, cy=0, lbutton_pressed=False, rbutton_pressed=False):
+        self.cx = cx
+        self.cy = cy
+        self.lbutton_pressed = lbutton_pressed
+        self.rbutton_pressed = rbutton_pressed
+
+
+_commands = iter(())
+_mouse = Mouse()
+keys_read = 0  #how many commands the game has taken from the script
+
+
+def set_input(commands):
+    #set the script the game reads its input from. each command is either a
+    #one-character string (that key is pressed), 'escape', or ('click', x, y)
+    #for a left click on console cell (x, y). once the script runs out, escape
+    #is pressed, which leaves menus, targeting and finally the game.
+    global _commands, keys_read
+    _commands = iter(commands)
+    keys_read = 0
+
+
+def random_commands(seed=None):
+    #an endless script of random moves, rests, pickups and prayers, for simulations
+    rng = random.Random(seed)
+    while True:
+        yield rng.choice('hjklyubn.hjklyubngp')
+
+
+def _next_key():
+    global _mouse, keys_read
+    command = next(_commands, 'escape')
+    keys_read += 1
+    if command == 'escape':
+        return Key(KEY_ESCAPE)
+    if isinstance(command, tuple):
+        #a click: no key this time, the next mouse_get_status() sees it
+        (_, x, y) = command
+        _mouse = Mouse(x, y, lbutton_pressed=True)
+        return Key()
+    return Key(KEY_CHAR, ord(command))
+
+
+def console_check_for_keypress(flags=KEY_RELEASED):
+    return _next_key()
+
+
+def console_wait_for_keypress(flush):
+    return _next_key()
+
+
+def mouse_get_status():
+    global _mouse
+    mouse = _mouse
+    _mouse = Mouse(mouse.cx, mouse.cy)
+    return mouse
+
+#############################################
+# Random numbers
+#############################################
+
+_random = random.Random()
+
+
+def random_seed(seed):
+    #make a simulation repeatable
+    _random.seed(seed)
+
+
+def random_get_int(rnd, mi, ma):
+    if mi > ma:
+        (mi, ma) = (ma, mi)
+    return _random.randint(mi, ma)
+
+
+def random_get_float(rnd, mi, ma):
+    return _random.uniform(mi, ma)
+
+#############################################
+# Lines (same algorithm as libtcod's)
+#############################################
+
+_line = None
+
+
+def line_init(xo, yo, xd, yd):
+    global _line
+    _line = bresenham.line(xo, yo, xd, yd)
+
+
+def line_step():
+    return next(_line, (None, None))
+
+#############################################
+# Console (nothing is drawn)
+#############################################
+
+def _nothing(*args, **kwargs):
+    pass
+
+console_set_custom_font = _nothing
+console_init_root = _nothing
+console_set_fullscreen = _nothing
+sys_set_fps = _nothing
+console_flush = _nothing
+console_blit = _nothing
+console_clear = _nothing
+console_rect = _nothing
+console_put_char = _nothing
+console_put_char_ex = _nothing
+console_set_back = _nothing
+console_set_foreground_color = _nothing
+console_set_background_color = _nothing
+console_print_left = _nothing
+console_print_center = _nothing
+console_print_left_rect = _nothing
+console_print_center_rect = _nothing
+console_fill_background = _nothing
+
+
+def console_new(w, h):
+    return 0
+
+
+def console_height_left_rect(con, x, y, w, h, fmt):
+    return 1
+
+
+def console_is_fullscreen():
+    return False
+
+
+def console_is_window_closed():
+    return False
@@ -0,0 +1,135 @@
+from collections import OrderedDict
+import numpy
+
+#keeps track of which objects stand on which tile, so that "is anything
+#blocking here?" and "who is standing there?" don't need to scan every object.
+
+
+class ObjectListener(object):
+    #something that wants to hear about changes to an ObjectList.
+    #subclasses override the events they care about
+    def added(self, obj):
+        pass
+
+    def removed(self, obj):
+        pass
+
+    def moved(self, obj, old_x, old_y):
+        pass
+
+    def blocks_changed(self, obj):
+        pass
+
+    def ai_changed(self, obj):
+        pass
+
+    def fighter_changed(self, obj):
+        pass
+
+    def layer_changed(self, obj):
+        pass
+
+
+class ObjectList(object):
+    #the objects on a level. it's used like a list (append, remove, len and
+    #loops), but it's an ordered set underneath so that removing an object,
+    #e.g. when a monster dies, doesn't shift everything after it. every object
+    #in it knows its container, and the listeners are told whenever an object
+    #is added, removed, moves, starts/stops blocking, gets a new AI or fighter or
+    #moves to another render layer.
+    def __init__(self, listeners=(), objects=()):
+        self.members = OrderedDict()  #object -> None, in the order they were added
+        self.listeners = list(listeners)
+        for obj in objects:
+            self.append(obj)
+
+    def __iter__(self):
+        return iter(self.members)
+
+    def __len__(self):
+        return len(self.members)
+
+    def __contains__(self, obj):
+        return obj in self.members
+
+    def append(self, obj):
+        self.members[obj] = None
+        self._added(obj)
+
+    def remove(self, obj):
+        del self.members[obj]
+        obj.container = None
+        for listener in self.listeners:
+            listener.removed(obj)
+
+    def _added(self, obj):
+        obj.container = self
+        for listener in self.listeners:
+            listener.added(obj)
+
+    def object_moved(self, obj, old_x, old_y):
+        for listener in self.listeners:
+            listener.moved(obj, old_x, old_y)
+
+    def object_blocks_changed(self, obj):
+        for listener in self.listeners:
+            listener.blocks_changed(obj)
+
+    def object_ai_changed(self, obj):
+        for listener in self.listeners:
+            listener.ai_changed(obj)
+
+    def object_fighter_changed(self, obj):
+        for listener in self.listeners:
+            listener.fighter_changed(obj)
+
+    def object_layer_changed(self, obj):
+        for listener in self.listeners:
+            listener.layer_changed(obj)
+
+
+class OccupancyGrid(ObjectListener):
+    #a per-level index of objects by tile, plus a count of blocking objects per tile
+    def __init__(self, width, height):
+        self.blockers = numpy.zeros((width, height), dtype=numpy.int16)
+        self.cells = {}  #(x, y) -> list of the objects on that tile
+
+    def added(self, obj):
+        self.cells.setdefault((obj.x, obj.y), []).append(obj)
+        if obj.blocks:
+            self.blockers[obj.x, obj.y] += 1
+
+    def removed(self, obj):
+        self._leave(obj, obj.x, obj.y)
+
+    def moved(self, obj, old_x, old_y):
+        self._leave(obj, old_x, old_y)
+        self.added(obj)
+
+    def blocks_changed(self, obj):
+        if obj.blocks:
+            self.blockers[obj.x, obj.y] += 1
+        else:
+            self.blockers[obj.x, obj.y] -= 1
+
+    def _leave(self, obj, x, y):
+        cell = self.cells[(x, y)]
+        cell.remove(obj)
+        if not cell:
+            del self.cells[(x, y)]
+        if obj.blocks:
+            self.blockers[x, y] -= 1
+
+    def is_blocked(self, x, y):
+        #true if a blocking object stands on this tile
+        return self.blockers[x, y] > 0
+
+    def objects_at(self, x, y):
+        return self.cells.get((x, y), ())
+
+    def fighter_at(self, x, y, exclude=None):
+        #return the first object on this tile that can fight, or None
+        for obj in self.cells.get((x, y), ()):
+            if obj.fighter and obj is not exclude:
+                return obj
+        return None
@@ -0,0 +1,72 @@
+import numpy
+
+#shared path finding for monsters.
+
+UNREACHED = numpy.iinfo(numpy.int32).max
+
+#the 8 steps a monster can take
+_STEPS = [(-1, -1), (0, -1), (1, -1), (-1, 0), (1, 0), (-1, 1), (0, 1), (1, 1)]
+
+
+class FlowField(object):
+    #the number of moves from every tile to a goal, up to max_distance moves,
+    #found with a breadth-first flood from the goal (dijkstra with every move,
+    #diagonals included, costing 1). it only looks at the terrain, so it can be
+    #computed once and used by every monster heading for the same goal.
+    def __init__(self, blocked, x, y, max_distance):
+        self.x = x
+        self.y = y
+        (width, height) = blocked.shape
+        #only the square the flood can reach is worked on
+        self.x0 = max(0, x - max_distance)
+        self.y0 = max(0, y - max_distance)
+        x1 = min(width, x + max_distance + 1)
+        y1 = min(height, y + max_distance + 1)
+        walkable = ~blocked[self.x0:x1, self.y0:y1]
+
+        self.distance = numpy.empty(walkable.shape, dtype=numpy.int32)
+        self.distance.fill(UNREACHED)
+        reached = numpy.zeros(walkable.shape, dtype=numpy.bool_)
+        reached[x - self.x0, y - self.y0] = True
+        self.distance[x - self.x0, y - self.y0] = 0
+        frontier = reached.copy()
+        for d in range(1, max_distance + 1):
+            #grow the frontier by one tile in all 8 directions
+            grown = frontier.copy()
+            grown[1:, :] |= frontier[:-1, :]
+            grown[:-1, :] |= frontier[1:, :]
+            wide = grown.copy()
+            wide[:, 1:] |= grown[:, :-1]
+            wide[:, :-1] |= grown[:, 1:]
+            frontier = wide & walkable & ~reached
+            if not frontier.any():
+                break
+            self.distance[frontier] = d
+            reached |= frontier
+
+    def distance_at(self, x, y):
+        #moves from (x, y) to the goal, or UNREACHED
+        (w, h) = self.distance.shape
+        fx = x - self.x0
+        fy = y - self.y0
+        if 0 <= fx < w and 0 <= fy < h:
+            return int(self.distance[fx, fy])
+        return UNREACHED
+
+    def step_from(self, x, y, is_blocked):
+        #the best step (dx, dy) towards the goal from (x, y): the free neighbor
+        #nearest to the goal. (0, 0) if every step closer is blocked, None if
+        #the field doesn't reach (x, y). the straight step towards the goal
+        #wins ties, so monsters in the open walk like they used to.
+        here = self.distance_at(x, y)
+        if here == UNREACHED:
+            return None
+        straight = ((self.x > x) - (self.x < x), (self.y > y) - (self.y < y))
+        best = (0, 0)
+        best_distance = here
+        for (dx, dy) in [straight] + _STEPS:
+            d = self.distance_at(x + dx, y + dy)
+            if d < best_distance and not is_blocked(x + dx, y + dy):
+                best = (dx, dy)
+                best_distance = d
+        return best
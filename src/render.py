@@ -0,0 +1,194 @@
+from collections import OrderedDict
+import numpy
+from occupancy import ObjectListener
+
+#helpers for drawing the scrolling map view with whole-array operations
+#instead of one console call per tile.
+
+
+def rgb(color):
+    #turn a libtcod color into a numpy [r, g, b] array
+    return numpy.array([color.r, color.g, color.b], dtype=numpy.uint8)
+
+
+def view_window(cx, cy, view_width, view_height, map_width, map_height):
+    #the view is centered on (cx, cy) and mirrored, so view column vx shows
+    #map column cx - vx + view_width / 2 (same for rows). returns the map
+    #coordinates for every view column and row, clipped to the map, plus masks
+    #of which columns and rows actually fall inside the map.
+    xs = cx + view_width // 2 - numpy.arange(view_width)
+    ys = cy + view_height // 2 - numpy.arange(view_height)
+    x_in = (xs >= 0) & (xs < map_width)
+    y_in = (ys >= 0) & (ys < map_height)
+    return numpy.clip(xs, 0, map_width - 1), numpy.clip(ys, 0, map_height - 1), x_in, y_in
+
+
+def background(tilemap, visible, window, dark_wall, light_wall, dark_ground, light_ground):
+    #compute the background color of every cell in the view as a
+    #(view_height, view_width, 3) array, and mark the visible tiles as explored.
+    #visible is a boolean array the size of the map (the FOV result).
+    (xs, ys, x_in, y_in) = window
+    inside = y_in[:, None] & x_in[None, :]
+
+    #pick out the view's tiles, laid out [vy, vx] like the console
+    wall = tilemap.block_sight[xs[None, :], ys[:, None]]
+    lit = visible[xs[None, :], ys[:, None]] & inside
+    explored = tilemap.explored[xs[None, :], ys[:, None]] & inside
+
+    colors = numpy.zeros(wall.shape + (3,), dtype=numpy.uint8)
+    dark = explored & ~lit
+    colors[dark & wall] = rgb(dark_wall)
+    colors[dark & ~wall] = rgb(dark_ground)
+    colors[lit & wall] = rgb(light_wall)
+    colors[lit & ~wall] = rgb(light_ground)
+
+    #since they are visible, explore them
+    tilemap.explored |= visible
+    return colors
+
+
+class FrameBuffer(object):
+    #an off-screen copy of the view's characters and colors. each frame is drawn
+    #here first, then only the cells that differ from the previous frame are
+    #sent to the console.
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.char = numpy.zeros((height, width), dtype=numpy.int32)
+        self.fg = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+        self.bg = numpy.zeros((height, width, 3), dtype=numpy.uint8)
+        self.clear()
+        self.invalidate()
+        self.dirty = 0  #number of cells that changed in the last frame
+
+    def clear(self):
+        #start a new frame: blank characters on a black background
+        self.char[:] = ord(' ')
+        self.fg[:] = 0
+        self.bg[:] = 0
+
+    def invalidate(self):
+        #forget the previous frame, so that the next one is pushed in full.
+        #needed whenever something else has drawn on the console.
+        self.prev_char = None
+        self.prev_fg = None
+        self.prev_bg = None
+
+    def put(self, x, y, char, color):
+        #draw a character in the given color, keeping the background
+        if 0 <= x < self.width and 0 <= y < self.height:
+            self.char[y, x] = ord(char) if isinstance(char, str) else char
+            self.fg[y, x] = rgb(color)
+
+    def changed(self):
+        #return a boolean [y, x] mask of the cells that differ from the previous frame.
+        #the foreground color of a blank cell can't be seen, so it is ignored
+        if self.prev_char is None:
+            return numpy.ones((self.height, self.width), dtype=numpy.bool_)
+        shown = self.char != ord(' ')
+        mask = (self.char != self.prev_char) | (self.bg != self.prev_bg).any(axis=2)
+        mask |= shown & (self.fg != self.prev_fg).any(axis=2)
+        return mask
+
+    def present(self, libtcod, con):
+        #send this frame to the console and remember it for the next diff.
+        #when most of the view changed (e.g. it scrolled) it's cheaper to clear
+        #the console and fill the whole background at once, then only put the
+        #non-blank characters.
+        mask = self.changed()
+        self.dirty = int(mask.sum())
+        shown = self.char != ord(' ')
+        if self.prev_char is None or self.dirty > int(shown.sum()) + 2:
+            libtcod.console_clear(con)
+            libtcod.console_fill_background(con, self.bg[:, :, 0].ravel(), self.bg[:, :, 1].ravel(), self.bg[:, :, 2].ravel())
+            cells = shown
+        else:
+            cells = mask
+        for (y, x) in zip(*numpy.nonzero(cells)):
+            fg = self.fg[y, x]
+            bg = self.bg[y, x]
+            libtcod.console_put_char_ex(con, int(x), int(y), int(self.char[y, x]),
+                libtcod.Color(int(fg[0]), int(fg[1]), int(fg[2])), libtcod.Color(int(bg[0]), int(bg[1]), int(bg[2])))
+
+        self.prev_char = self.char.copy()
+        self.prev_fg = self.fg.copy()
+        self.prev_bg = self.bg.copy()
+
+
+#############################################
+# Render layers
+#############################################
+
+#what is drawn over what on the same tile: lower layers are drawn first
+DECAL = 0  #stairs and other marks on the floor
+ITEM = 1
+ACTOR = 2
+PLAYER = 3
+LAYERS = (DECAL, ITEM, ACTOR, PLAYER)
+
+
+class RenderLayers(ObjectListener):
+    #the level's objects sorted by layer. every layer is an ordered set, so an
+    #object is added or removed (or moved to another layer) in constant time,
+    #and the draw order comes from the layer rather than the place in a list.
+    def __init__(self):
+        self.layers = [OrderedDict() for layer in LAYERS]
+        self.layer_of = {}  #object -> the layer it's in
+
+    def added(self, obj):
+        self.layers[obj.layer][obj] = None
+        self.layer_of[obj] = obj.layer
+
+    def removed(self, obj):
+        layer = self.layer_of.pop(obj, None)
+        if layer is not None:
+            del self.layers[layer][obj]
+
+    def layer_changed(self, obj):
+        self.removed(obj)
+        self.added(obj)
+
+    def in_draw_order(self):
+        for layer in self.layers:
+            for obj in layer:
+                yield obj
+
+
+#############################################
+# Static decals
+#############################################
+
+class DecalMap(object):
+    #marks on the floor that never move or act again, like corpses. they are
+    #not objects: each tile holds an index into a short list of kinds (0 for
+    #none), so the loops over the level's objects never see them. only the
+    #last decal put on a tile is kept.
+    def __init__(self, width, height):
+        self.index = numpy.zeros((width, height), dtype=numpy.int16)
+        self.kinds = [None]  #also keeps the kinds alive, so their ids stay theirs
+        #id of a kind -> its index in kinds. kinds hold libtcod colors, which
+        #can't be hashed, so they're told apart by identity
+        self.kind_index = {}
+
+    def put(self, x, y, kind):
+        i = self.kind_index.get(id(kind))
+        if i is None:
+            i = self.kind_index[id(kind)] = len(self.kinds)
+            self.kinds.append(kind)
+        self.index[x, y] = i
+
+    def at(self, x, y):
+        #the kind of the decal on this tile, or None
+        return self.kinds[self.index[x, y]]
+
+    def draw(self, frame, visible, window):
+        #draw the decals on the visible tiles of the view, one kind at a time
+        (xs, ys, x_in, y_in) = window
+        inside = y_in[:, None] & x_in[None, :]
+        shown = self.index[xs[None, :], ys[:, None]]
+        shown[~(visible[xs[None, :], ys[:, None]] & inside)] = 0
+        for i in numpy.unique(shown[shown > 0]).tolist():
+            cells = shown == i
+            kind = self.kinds[i]
+            frame.char[cells] = ord(kind.char)
+            frame.fg[cells] = rgb(kind.color)
@@ -0,0 +1,72 @@
+import bisect
+import numpy
+
+#weighted random choices from tables compiled ahead of time, so that a roll
+#costs a lookup instead of a chain of comparisons.
+
+
+class CumulativeTable(object):
+    #picks among choices with integer weights: a roll in [0, total) is looked
+    #up by bisection in the running totals of the weights
+    def __init__(self, choices, weights):
+        pairs = [(choice, weight) for (choice, weight) in zip(choices, weights) if weight > 0]
+        self.choices = [choice for (choice, weight) in pairs]
+        self.cumulative = []
+        total = 0
+        for (choice, weight) in pairs:
+            total += weight
+            self.cumulative.append(total)
+        self.total = total
+        self.cumulative_array = numpy.array(self.cumulative, dtype=numpy.int64)
+
+    def pick(self, roll):
+        #the choice for a roll in [0, total)
+        return self.choices[bisect.bisect_right(self.cumulative, roll)]
+
+    def pick_many(self, rolls):
+        #the choices for a whole list of rolls at once
+        indexes = numpy.searchsorted(self.cumulative_array, numpy.asarray(rolls, dtype=numpy.int64), side='right')
+        return [self.choices[i] for i in indexes.tolist()]
+
+
+class AliasTable(object):
+    #picks among choices with integer weights in constant time, whatever the
+    #number of choices (Vose's alias method, in whole numbers). the choices are
+    #split into columns of equal height, each holding at most two of them; a
+    #roll in [0, total) gives a column and a height in it.
+    def __init__(self, choices, weights):
+        pairs = [(choice, weight) for (choice, weight) in zip(choices, weights) if weight > 0]
+        self.choices = [choice for (choice, weight) in pairs]
+        count = len(pairs)
+        self.height = sum(weight for (choice, weight) in pairs)
+        self.total = count * self.height
+        #each column i keeps choice i up to threshold[i] and its alias above it
+        self.threshold = [self.height] * count
+        self.alias = list(range(count))
+        scaled = [weight * count for (choice, weight) in pairs]
+        small = [i for i in range(count) if scaled[i] < self.height]
+        large = [i for i in range(count) if scaled[i] >= self.height]
+        while small and large:
+            (s, l) = (small.pop(), large.pop())
+            self.threshold[s] = scaled[s]
+            self.alias[s] = l
+            scaled[l] -= self.height - scaled[s]
+            if scaled[l] < self.height:
+                small.append(l)
+            else:
+                large.append(l)
+        self.threshold_array = numpy.array(self.threshold, dtype=numpy.int64)
+        self.alias_array = numpy.array(self.alias, dtype=numpy.int64)
+
+    def pick(self, roll):
+        #the choice for a roll in [0, total)
+        (column, height) = divmod(roll, self.height)
+        if height < self.threshold[column]:
+            return self.choices[column]
+        return self.choices[self.alias[column]]
+
+    def pick_many(self, rolls):
+        #the choices for a whole list of rolls at once
+        (columns, heights) = numpy.divmod(numpy.asarray(rolls, dtype=numpy.int64), self.height)
+        indexes = numpy.where(heights < self.threshold_array[columns], columns, self.alias_array[columns])
+        return [self.choices[i] for i in indexes.tolist()]
@@ -0,0 +1,68 @@
+import heapq
+from occupancy import ObjectListener
+
+#decides which monsters act when. every object with an AI waits in a heap
+#ordered by the time of its next action, and acts again after a delay that
+#depends on its speed, so the turn's work only depends on who acts.
+
+NORMAL_SPEED = 100
+ACTION_TIME = 100  #how long an action takes at normal speed, i.e. one player turn
+
+
+def action_delay(obj):
+    #time between two actions of this object: faster fighters act more often
+    speed = obj.fighter.speed if obj.fighter else NORMAL_SPEED
+    return max(1, ACTION_TIME * NORMAL_SPEED // max(1, speed))
+
+
+class Scheduler(ObjectListener):
+    #a heap of [next action time, sequence number, object] entries. an object
+    #that stops acting has its entry emptied rather than dug out of the heap,
+    #and the empty entry is thrown away when it reaches the top.
+    def __init__(self):
+        self.time = 0
+        self.queue = []
+        self.entries = {}  #object -> its entry in the queue
+        self.count = 0  #tie breaker, so that actors due at the same time keep their order
+
+    def added(self, obj):
+        if obj.ai:
+            self.schedule(obj, self.time + action_delay(obj))
+
+    def removed(self, obj):
+        self.cancel(obj)
+
+    def ai_changed(self, obj):
+        #a monster that dies loses its AI; one that gets another AI (e.g. it's
+        #confused) keeps its place
+        if not obj.ai:
+            self.cancel(obj)
+        elif obj not in self.entries:
+            self.schedule(obj, self.time + action_delay(obj))
+
+    def schedule(self, obj, time):
+        self.cancel(obj)
+        entry = [time, self.count, obj]
+        self.count += 1
+        self.entries[obj] = entry
+        heapq.heappush(self.queue, entry)
+
+    def cancel(self, obj):
+        entry = self.entries.pop(obj, None)
+        if entry is not None:
+            entry[-1] = None
+
+    def __len__(self):
+        return len(self.entries)
+
+    def advance(self, duration=ACTION_TIME):
+        #let time pass, and every object whose action is due take its turn
+        self.time += duration
+        while self.queue and self.queue[0][0] <= self.time:
+            (time, count, obj) = heapq.heappop(self.queue)
+            if obj is None:
+                continue  #it was cancelled
+            del self.entries[obj]
+            #schedule the next action first, so that the AI can still cancel it
+            self.schedule(obj, time + action_delay(obj))
+            obj.ai.take_turn()
@@ -0,0 +1,84 @@
+from occupancy import ObjectListener
+
+#finds the fighters nearest to a tile without looking at every object:
+#the level is cut into square cells, each with a bucket of the live
+#fighters standing in it, and the search only opens the cells around the tile.
+
+CELL_SIZE = 8
+
+
+class FighterGrid(ObjectListener):
+    def __init__(self, cell_size=CELL_SIZE):
+        self.cell_size = cell_size
+        self.buckets = {}  #(cell x, cell y) -> list of the fighters in that cell
+        self.cell_of = {}  #fighter -> the cell it's in
+
+    def cell(self, x, y):
+        return (x // self.cell_size, y // self.cell_size)
+
+    def added(self, obj):
+        if obj.fighter:
+            self._put(obj, self.cell(obj.x, obj.y))
+
+    def removed(self, obj):
+        self._take(obj)
+
+    def moved(self, obj, old_x, old_y):
+        cell = self.cell_of.get(obj)
+        if cell is not None and cell != self.cell(obj.x, obj.y):
+            self._take(obj)
+            self._put(obj, self.cell(obj.x, obj.y))
+
+    def fighter_changed(self, obj):
+        #fighters that die lose their fighter component, and drop out
+        self._take(obj)
+        self.added(obj)
+
+    def _put(self, obj, cell):
+        self.buckets.setdefault(cell, []).append(obj)
+        self.cell_of[obj] = cell
+
+    def _take(self, obj):
+        cell = self.cell_of.pop(obj, None)
+        if cell is not None:
+            bucket = self.buckets[cell]
+            bucket.remove(obj)
+            if not bucket:
+                del self.buckets[cell]
+
+    def __len__(self):
+        return len(self.cell_of)
+
+    def nearest(self, x, y, k=1, max_distance=None, visible=None, exclude=None):
+        #the k fighters closest to (x, y), nearest first. only fighters less
+        #than max_distance away count, and if a visible [x, y] boolean array is
+        #given, only those standing on a visible tile.
+        (cx, cy) = self.cell(x, y)
+        if max_distance is None:
+            last_ring = max([0] + [max(abs(bx - cx), abs(by - cy)) for (bx, by) in self.buckets])
+            limit = None
+        else:
+            last_ring = int(max_distance) // self.cell_size + 1
+            limit = max_distance * max_distance
+        found = []  #(squared distance, fighter)
+        for ring in range(last_ring + 1):
+            #the cells at exactly "ring" cells from (cx, cy), going around the square
+            if ring == 0:
+                cells = [(cx, cy)]
+            else:
+                cells = [(cx + i, cy - ring) for i in range(-ring, ring + 1)]
+                cells += [(cx + i, cy + ring) for i in range(-ring, ring + 1)]
+                cells += [(cx - ring, cy + j) for j in range(-ring + 1, ring)]
+                cells += [(cx + ring, cy + j) for j in range(-ring + 1, ring)]
+            for cell in cells:
+                for obj in self.buckets.get(cell, ()):
+                    if obj is exclude:
+                        continue
+                    d = (obj.x - x) ** 2 + (obj.y - y) ** 2
+                    if (limit is None or d < limit) and (visible is None or visible[obj.x, obj.y]):
+                        found.append((d, obj))
+            found.sort(key=lambda f: f[0])
+            #every fighter in the cells further out is more than ring * cell_size tiles away
+            if len(found) >= k and found[k - 1][0] <= (ring * self.cell_size + 1) ** 2:
+                break
+        return [obj for (d, obj) in found[:k]]
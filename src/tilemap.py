@@ -0,0 +1,94 @@
+import numpy
+
+#the dungeon map, stored as parallel arrays instead of one object per tile.
+#every array is indexed [x, y] so it lines up with the old map[x][y] lists.
+
+
+class Tile(object):
+    #a view of a single tile of a TileMap. it holds no state of its own,
+    #reads and writes go straight through to the map's arrays.
+    __slots__ = ('tilemap', 'x', 'y')
+
+    def __init__(self, tilemap, x, y):
+        self.tilemap = tilemap
+        self.x = x
+        self.y = y
+
+    def get_blocked(self):
+        return bool(self.tilemap.blocked[self.x, self.y])
+
+    def set_blocked(self, value):
+        self.tilemap.blocked[self.x, self.y] = value
+        self.tilemap.revision += 1
+
+    def get_block_sight(self):
+        return bool(self.tilemap.block_sight[self.x, self.y])
+
+    def set_block_sight(self, value):
+        self.tilemap.block_sight[self.x, self.y] = value
+        self.tilemap.revision += 1
+
+    def get_explored(self):
+        return bool(self.tilemap.explored[self.x, self.y])
+
+    def set_explored(self, value):
+        self.tilemap.explored[self.x, self.y] = value
+
+    blocked = property(get_blocked, set_blocked)
+    block_sight = property(get_block_sight, set_block_sight)
+    explored = property(get_explored, set_explored)
+
+
+class TileColumn(object):
+    #one column of the map, so that map[x][y] keeps working
+    def __init__(self, tilemap, x):
+        self.tilemap = tilemap
+        self.x = x
+
+    def __getitem__(self, y):
+        return Tile(self.tilemap, self.x, y)
+
+    def __len__(self):
+        return self.tilemap.height
+
+
+class TileMap(object):
+    #the whole map. all tiles start blocked (and so blocking sight) and unexplored.
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.blocked = numpy.ones((width, height), dtype=numpy.bool_)
+        self.block_sight = numpy.ones((width, height), dtype=numpy.bool_)
+        self.explored = numpy.zeros((width, height), dtype=numpy.bool_)
+        #which room each tile belongs to (an index into rooms), -1 outside rooms
+        self.room_id = numpy.empty((width, height), dtype=numpy.int16)
+        self.room_id.fill(-1)
+        self.rooms = []  #the floor of each room, as (x1, x2, y1, y2) like carve()
+        #bumped whenever the terrain (blocked or block_sight) changes, so that
+        #anything computed from it knows when to throw its results away
+        self.revision = 0
+
+    def __getitem__(self, x):
+        return TileColumn(self, x)
+
+    def __len__(self):
+        return self.width
+
+    def carve(self, x1, x2, y1, y2):
+        #make the tiles in [x1, x2) x [y1, y2) passable, in one slice assignment
+        self.blocked[x1:x2, y1:y2] = False
+        self.block_sight[x1:x2, y1:y2] = False
+        self.revision += 1
+
+    def add_room(self, x1, x2, y1, y2):
+        #carve out a room and remember its floor
+        self.carve(x1, x2, y1, y2)
+        self.room_id[x1:x2, y1:y2] = len(self.rooms)
+        self.rooms.append((x1, x2, y1, y2))
+
+    def room_at(self, x, y):
+        #the floor (x1, x2, y1, y2) of the room at (x, y), or None in a corridor
+        room = self.room_id[x, y]
+        if room < 0:
+            return None
+        return self.rooms[room]
@@ -177,21 +177,41 @@ class Fighter:
         self.base_power = power
         self.xp = xp
         self.death_function = death_function
+        self.set_equipment([])
  
     @property
-    def power(self):  #return actual power, by summing up the bonuses from all equipped items
-        bonus = sum(equipment.power_bonus for equipment in get_all_equipped(self.owner))
-        return self.base_power + bonus
+    def power(self):  #return actual power, with the bonus from all equipped items
+        return self.base_power + self.power_bonus
  
     @property
-    def defense(self):  #return actual defense, by summing up the bonuses from all equipped items
-        bonus = sum(equipment.defense_bonus for equipment in get_all_equipped(self.owner))
-        return self.base_defense + bonus
+    def defense(self):  #return actual defense, with the bonus from all equipped items
+        return self.base_defense + self.defense_bonus
  
     @property
-    def max_hp(self):  #return actual max_hp, by summing up the bonuses from all equipped items
-        bonus = sum(equipment.max_hp_bonus for equipment in get_all_equipped(self.owner))
-        return self.base_max_hp + bonus
+    def max_hp(self):  #return actual max_hp, with the bonus from all equipped items
+        return self.base_max_hp + self.max_hp_bonus
+ 
+    def set_equipment(self, equipment_list):
+        #start over with these items equipped, and total up their bonuses
+        self.equipped = {}  #slot -> the equipment in it
+        self.power_bonus = 0
+        self.defense_bonus = 0
+        self.max_hp_bonus = 0
+        for equipment in equipment_list:
+            self.add_equipment(equipment)
+ 
+    def add_equipment(self, equipment):
+        #keep the bonus totals up to date, so reading a stat doesn't have to look at every item
+        self.equipped[equipment.slot] = equipment
+        self.power_bonus += equipment.power_bonus
+        self.defense_bonus += equipment.defense_bonus
+        self.max_hp_bonus += equipment.max_hp_bonus
+ 
+    def remove_equipment(self, equipment):
+        del self.equipped[equipment.slot]
+        self.power_bonus -= equipment.power_bonus
+        self.defense_bonus -= equipment.defense_bonus
+        self.max_hp_bonus -= equipment.max_hp_bonus
  
     def attack(self, target):
         #a simple formula for attack damage
@@ -323,28 +343,23 @@ class Equipment:
  
         #equip object and show a message about it
         self.is_equipped = True
+        player.fighter.add_equipment(self)
         message('Equipped ' + self.owner.name + ' on ' + self.slot + '.', libtcod.light_green)
  
     def dequip(self):
         #dequip object and show a message about it
         if not self.is_equipped: return
         self.is_equipped = False
+        player.fighter.remove_equipment(self)
         message('Dequipped ' + self.owner.name + ' from ' + self.slot + '.', libtcod.light_yellow)
  
  
 def get_equipped_in_slot(slot):  #returns the equipment in a slot, or None if it's empty
-    for obj in inventory:
-        if obj.equipment and obj.equipment.slot == slot and obj.equipment.is_equipped:
-            return obj.equipment
-    return None
+    return player.fighter.equipped.get(slot)
  
 def get_all_equipped(obj):  #returns a list of equipped items
-    if obj == player:
-        equipped_list = []
-        for item in inventory:
-            if item.equipment and item.equipment.is_equipped:
-                equipped_list.append(item.equipment)
-        return equipped_list
+    if obj.fighter:
+        return obj.fighter.equipped.values()
     else:
         return []  #other objects have no equipment
  
@@ -1015,6 +1030,9 @@ def load_game():
     game_msgs = file['game_msgs']
     game_state = file['game_state']
     dungeon_level = file['dungeon_level']
+    #the inventory was saved apart from the player, so point the player's
+    #equipment slots at the loaded items again
+    player.fighter.set_equipment([item.equipment for item in inventory if item.equipment and item.equipment.is_equipped])
     file.close()
  
     initialize_fov()